@@ -3,16 +3,18 @@ Flask Application Factory
 Creates and configures the Flask application
 """
 
-from flask import Flask
-from flask_cors import CORS
+import orjson
+from flask import Flask, Response
 
 from app.config import get_config
-from app.core.model import ModelManager
+from app.core.model import ModelManager, configure_tf_threading
 from app.core.predictor import DiseasePredictor
 from app.data.disease_info import DiseaseDatabase
+from app.services.batching import BatchInferenceService
 from app.utils.image_utils import ImageProcessor
 from app.utils.logger import setup_logger, get_logger
 from app.api import routes
+from app.api.middleware import init_cors
 
 
 def create_app(config_name=None):
@@ -52,23 +54,26 @@ def create_app(config_name=None):
     logger.info(f"Environment: {app.config.get('ENV', 'development')}")
     
     # Enable CORS
-    CORS(app, resources={
-        r"/api/*": {
-            "origins": config.CORS_ORIGINS,
-            "methods": ["GET", "POST", "OPTIONS"],
-            "allow_headers": ["Content-Type", "Authorization"]
-        }
-    })
+    init_cors(app, config.CORS_ORIGINS)
     logger.info(f"CORS enabled for origins: {config.CORS_ORIGINS}")
     
     # Initialize components
     try:
+        # Thread pools must be sized before TensorFlow initializes
+        configure_tf_threading(config.INTRA_OP_THREADS, config.INTER_OP_THREADS)
+        
         # Model Manager
         logger.info("Initializing Model Manager...")
         model_manager = ModelManager(
             model_path=config.MODEL_PATH,
             class_labels_path=config.CLASS_LABELS_PATH,
-            tflite_path=config.TFLITE_MODEL_PATH
+            tflite_path=config.TFLITE_MODEL_PATH,
+            tflite_num_threads=config.TFLITE_NUM_THREADS,
+            gpu_delegate_lib=(
+                config.GPU_DELEGATE_LIB if config.USE_GPU_DELEGATE else None
+            ),
+            load_keras=not config.SERVE_TFLITE_ONLY,
+            metadata_path=config.MODEL_METADATA_PATH
         )
         
         if not model_manager.is_ready():
@@ -80,24 +85,47 @@ def create_app(config_name=None):
         # Disease Database
         logger.info("Loading Disease Database...")
         disease_db = DiseaseDatabase()
-        logger.info("✓ Disease Database loaded")
+        logger.info(f"✓ Disease Database loaded ({len(disease_db.diseases)} diseases)")
+        
+        # Image Processor: input scaling comes from the model's metadata;
+        # NORMALIZE_INPUT only covers models saved without it
+        normalize = model_manager.normalize_input
+        if normalize is None:
+            normalize = config.NORMALIZE_INPUT
+        logger.info("Initializing Image Processor...")
+        image_processor = ImageProcessor(
+            target_size=config.IMG_SIZE,
+            max_size_mb=config.MAX_IMAGE_SIZE_MB,
+            fused_kernel=config.PREPROCESS_FUSED_KERNEL,
+            cache_size=config.PREPROCESS_CACHE_SIZE,
+            reuse_buffers=config.PREPROCESS_REUSE_BUFFERS,
+            data_format=model_manager.input_data_format,
+            normalize=normalize
+        )
+        logger.info(f"✓ Image Processor initialized (normalize={normalize})")
+        
+        # Batch Inference Service (optional)
+        batch_service = None
+        if config.BATCH_INFERENCE:
+            batch_service = BatchInferenceService(
+                model_manager=model_manager,
+                image_processor=image_processor,
+                max_batch=config.BATCH_INFERENCE_MAX_BATCH,
+                max_delay_ms=config.BATCH_INFERENCE_MAX_DELAY_MS,
+                timeout=config.REQUEST_TIMEOUT
+            )
+            logger.info("✓ Batch inference enabled")
         
         # Disease Predictor
         logger.info("Initializing Predictor...")
         predictor = DiseasePredictor(
             model_manager=model_manager,
-            disease_db=disease_db
+            disease_db=disease_db,
+            batch_service=batch_service,
+            image_processor=image_processor
         )
         logger.info("✓ Predictor initialized")
         
-        # Image Processor
-        logger.info("Initializing Image Processor...")
-        image_processor = ImageProcessor(
-            target_size=config.IMG_SIZE,
-            max_size_mb=config.MAX_IMAGE_SIZE_MB
-        )
-        logger.info("✓ Image Processor initialized")
-        
         # Initialize routes with dependencies
         routes.init_routes(
             mm=model_manager,
@@ -124,20 +152,22 @@ def create_app(config_name=None):
         logger.error(f"Failed to initialize application: {e}", exc_info=True)
         raise
     
-    # Health check route (root)
+    # Health check route (root); the payload is fixed, so encode it once
+    index_body = orjson.dumps({
+        "app": config.APP_NAME,
+        "version": config.VERSION,
+        "status": "running",
+        "endpoints": {
+            "health": "/api/health",
+            "predict": "/api/predict",
+            "batch_predict": "/api/predict/batch",
+            "model_info": "/api/model/info",
+            "classes": "/api/classes"
+        }
+    })
+    
     @app.route('/', methods=['GET'])
     def index():
-        return {
-            "app": config.APP_NAME,
-            "version": config.VERSION,
-            "status": "running",
-            "endpoints": {
-                "health": "/api/health",
-                "predict": "/api/predict",
-                "batch_predict": "/api/predict/batch",
-                "model_info": "/api/model/info",
-                "classes": "/api/classes"
-            }
-        }, 200
+        return Response(index_body, status=200, mimetype='application/json')
     
     return app
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""
+API Middleware
+Lightweight CORS handling for the API blueprint
+"""
+
+from typing import Iterable
+
+from flask import Flask, Response, request
+
+# Static preflight headers; browsers may cache the preflight for a day
+PREFLIGHT_HEADERS = {
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization",
+    "Access-Control-Max-Age": "86400",
+}
+
+
+def init_cors(app: Flask, origins: Iterable[str], path_prefix: str = "/api/"):
+    """
+    Register CORS hooks for paths under path_prefix
+    
+    Preflight requests are answered directly from a before_request hook,
+    and regular responses only get the allowed-origin header.
+    
+    Args:
+        app: Flask application
+        origins: Allowed origins ("*" allows any origin)
+        path_prefix: Only requests under this path get CORS headers
+    """
+    allowed = frozenset(o.strip() for o in origins if o.strip())
+    allow_any = "*" in allowed
+    
+    @app.before_request
+    def cors_preflight():
+        if request.method == "OPTIONS" and request.path.startswith(path_prefix):
+            return Response(status=204, headers=PREFLIGHT_HEADERS)
+        return None
+    
+    @app.after_request
+    def cors_allow_origin(response):
+        if not request.path.startswith(path_prefix):
+            return response
+        
+        origin = request.headers.get("Origin")
+        if allow_any:
+            if origin:
+                response.headers["Access-Control-Allow-Origin"] = "*"
+        else:
+            response.vary.add("Origin")
+            if origin in allowed:
+                response.headers["Access-Control-Allow-Origin"] = origin
+        return response
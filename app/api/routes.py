@@ -3,32 +3,111 @@ API Routes
 Defines all API endpoints
 """
 
-from flask import Blueprint, request, jsonify
-from datetime import datetime
-from typing import Dict
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+import orjson
+from flask import Blueprint, Response, request, g
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
 
 from app.api.schemas import validate_prediction_request, validate_batch_request
 from app.utils.logger import get_logger
+from app.utils.time_utils import iso_now
 
 logger = get_logger(__name__)
 
 # Create blueprint
 api = Blueprint('api', __name__, url_prefix='/api')
 
-# These will be injected by the app factory
-model_manager = None
-predictor = None
-image_processor = None
-config = None
+
+@dataclass(frozen=True)
+class Deps:
+    """Route dependencies injected by the app factory"""
+    model_manager: Any
+    predictor: Any
+    image_processor: Any
+    config: Any
+
+
+# Set by init_routes(); handlers copy what they need into locals
+_deps: Optional[Deps] = None
+
+# Shared pool for base64/image decoding (PIL and base64 release the GIL)
+_DECODE_POOL = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 1,
+    thread_name_prefix="image-decode"
+)
+
+# Pre-serialized bodies for payloads that never change after startup
+_HEALTH_JSON = None
+_MODEL_INFO_JSON = None
+_CLASSES_JSON = None
 
 
 def init_routes(mm, pred, img_proc, cfg):
     """Initialize routes with dependencies"""
-    global model_manager, predictor, image_processor, config
+    global _deps, _HEALTH_JSON, _MODEL_INFO_JSON, _CLASSES_JSON
+    _deps = Deps(
+        model_manager=mm,
+        predictor=pred,
+        image_processor=img_proc,
+        config=cfg
+    )
+    
     model_manager = mm
-    predictor = pred
-    image_processor = img_proc
     config = cfg
+    info = model_manager.get_model_info()
+    _HEALTH_JSON = _freeze_payload({
+        "status": "healthy",
+        "version": config.VERSION,
+        "app_name": config.APP_NAME,
+        "keras_model_loaded": info['keras_available'],
+        "tflite_model_loaded": info['tflite_available'],
+        "num_classes": info['num_classes'],
+    })
+    _MODEL_INFO_JSON = _freeze_payload({
+        "success": True,
+        "model_info": info,
+    })
+    _CLASSES_JSON = _freeze_payload({
+        "success": True,
+        "classes": orjson.Fragment(model_manager.class_labels_json),
+        "num_classes": model_manager.num_classes,
+    })
+
+
+def _freeze_payload(payload: Dict) -> bytes:
+    """
+    Serialize a constant payload once, leaving its timestamp open
+    
+    Returns:
+        bytes: JSON prefix to be completed by _frozen_response()
+    """
+    return _dumps(payload)[:-1] + b',"timestamp":"'
+
+
+def _dumps(obj) -> bytes:
+    """Serialize a response payload with orjson (numpy-aware)"""
+    return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def ojsonify(obj, status: int = 200) -> Response:
+    """orjson-backed drop-in for flask.jsonify"""
+    return Response(_dumps(obj), status=status, mimetype='application/json')
+
+
+def _frozen_response(prefix: bytes, status: int = 200) -> Response:
+    """Complete a frozen payload with the request timestamp"""
+    body = prefix + _request_timestamp().encode() + b'"}'
+    return Response(body, status=status, mimetype='application/json')
+
+
+def _request_timestamp() -> str:
+    """Timestamp shared by every response body built for this request"""
+    if 'timestamp' not in g:
+        g.timestamp = iso_now()
+    return g.timestamp
 
 
 @api.route('/health', methods=['GET'])
@@ -39,26 +118,7 @@ def health_check():
     Returns:
         JSON: Service health status
     """
-    try:
-        model_info = model_manager.get_model_info()
-        
-        return jsonify({
-            "status": "healthy",
-            "version": config.VERSION,
-            "app_name": config.APP_NAME,
-            "keras_model_loaded": model_info['keras_available'],
-            "tflite_model_loaded": model_info['tflite_available'],
-            "num_classes": model_info['num_classes'],
-            "timestamp": datetime.now().isoformat()
-        }), 200
-        
-    except Exception as e:
-        logger.error(f"Health check failed: {e}")
-        return jsonify({
-            "status": "unhealthy",
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }), 500
+    return _frozen_response(_HEALTH_JSON)
 
 
 @api.route('/predict', methods=['POST'])
@@ -69,7 +129,8 @@ def predict():
     Request Body:
         {
             "image": "base64_encoded_image",
-            "use_tflite": false (optional),
+            "use_tflite": bool (optional, defaults to the INT8 TFLite
+                model when loaded),
             "top_k": 3 (optional)
         }
     
@@ -84,56 +145,137 @@ def predict():
         is_valid, error_msg = validate_prediction_request(data)
         if not is_valid:
             logger.warning(f"Invalid request: {error_msg}")
-            return jsonify({
+            return ojsonify({
                 "success": False,
                 "error": error_msg,
-                "timestamp": datetime.now().isoformat()
-            }), 400
+                "timestamp": _request_timestamp()
+            }, 400)
         
-        # Extract parameters
-        image_data = data.get('image')
-        use_tflite = data.get('use_tflite', False)
-        top_k = data.get('top_k', 3)
+        # Decode base64 once; everything downstream works on raw bytes
+        image_bytes = _deps.image_processor.decode_image_data(data.get('image'))
         
+    except ValueError as e:
+        logger.error(f"Image decoding failed: {e}")
+        return ojsonify({
+            "success": False,
+            "error": "Invalid image format or size",
+            "timestamp": _request_timestamp()
+        }, 400)
+        
+    except Exception as e:
+        logger.error(f"Prediction failed: {e}", exc_info=True)
+        return ojsonify({
+            "success": False,
+            "error": "Internal server error during prediction",
+            "error_type": "server_error",
+            "timestamp": _request_timestamp()
+        }, 500)
+    
+    return _predict_image_bytes(
+        image_bytes,
+        use_tflite=data.get('use_tflite'),
+        # The schema's "integer" also admits 3.0; argpartition needs an int
+        top_k=int(data.get('top_k', 3))
+    )
+
+
+@api.route('/predict/raw', methods=['POST'])
+def predict_raw():
+    """
+    Single image prediction from an uploaded file (no base64)
+    
+    Request Body:
+        multipart/form-data with an "image" file field, or the raw image
+        bytes as the body (e.g. application/octet-stream)
+    
+    Query/Form Parameters:
+        use_tflite: true/false (optional, defaults to the INT8 TFLite
+            model when loaded)
+        top_k: 3 (optional)
+    
+    Returns:
+        JSON: Prediction results
+    """
+    upload = request.files.get('image')
+    if upload is not None:
+        image_bytes = upload.read()
+    else:
+        image_bytes = request.get_data(cache=False)
+    
+    if not image_bytes:
+        return ojsonify({
+            "success": False,
+            "error": "No image provided",
+            "timestamp": _request_timestamp()
+        }, 400)
+    
+    use_tflite = request.values.get('use_tflite')
+    if use_tflite is not None:
+        use_tflite = use_tflite.lower() in ('1', 'true', 'yes')
+    try:
+        top_k = int(request.values.get('top_k', 3))
+    except ValueError:
+        top_k = None
+    if top_k is None or not 1 <= top_k <= 10:
+        return ojsonify({
+            "success": False,
+            "error": "top_k must be an integer between 1 and 10",
+            "timestamp": _request_timestamp()
+        }, 400)
+    
+    return _predict_image_bytes(image_bytes, use_tflite=use_tflite, top_k=top_k)
+
+
+def _predict_image_bytes(image_bytes: bytes, use_tflite: Optional[bool],
+                         top_k: int) -> Response:
+    """Validate, preprocess and predict one image given its raw bytes"""
+    deps = _deps
+    predictor = deps.predictor
+    image_processor = deps.image_processor
+    
+    # Decode once; validation and preprocessing share the parsed image
+    try:
+        decoded = image_processor.decode(image_bytes)
+    except ValueError:
+        decoded = None
+    
+    try:
         # Validate image
-        if not image_processor.validate_image(image_data):
-            return jsonify({
+        if decoded is None or not image_processor.validate_image(decoded):
+            return ojsonify({
                 "success": False,
                 "error": "Invalid image format or size",
-                "timestamp": datetime.now().isoformat()
-            }), 400
+                "timestamp": _request_timestamp()
+            }, 400)
         
-        # Preprocess image
-        logger.info("Preprocessing image...")
-        image_array = image_processor.preprocess_image(image_data)
-        
-        # Predict
+        # Preprocess and predict (preprocessing moves to the batch
+        # service's workers when batching is enabled)
         logger.info("Making prediction...")
-        result = predictor.predict(
-            image_array,
+        result = predictor.predict_image(
+            decoded,
             use_tflite=use_tflite,
             top_k=top_k
         )
         
-        return jsonify(result), 200
+        return ojsonify(result, 200)
         
     except ValueError as e:
         logger.error(f"Validation error: {e}")
-        return jsonify({
+        return ojsonify({
             "success": False,
             "error": str(e),
             "error_type": "validation_error",
-            "timestamp": datetime.now().isoformat()
-        }), 400
+            "timestamp": _request_timestamp()
+        }, 400)
         
     except Exception as e:
         logger.error(f"Prediction failed: {e}", exc_info=True)
-        return jsonify({
+        return ojsonify({
             "success": False,
             "error": "Internal server error during prediction",
             "error_type": "server_error",
-            "timestamp": datetime.now().isoformat()
-        }), 500
+            "timestamp": _request_timestamp()
+        }, 500)
 
 
 @api.route('/predict/batch', methods=['POST'])
@@ -144,12 +286,18 @@ def predict_batch():
     Request Body:
         {
             "images": ["base64_image1", "base64_image2", ...],
-            "use_tflite": false (optional)
+            "use_tflite": bool (optional),
+            "detail": "full" | "minimal" (optional, default "full")
         }
     
     Returns:
         JSON: Batch prediction results
     """
+    deps = _deps
+    predictor = deps.predictor
+    image_processor = deps.image_processor
+    config = deps.config
+    
     try:
         # Get request data
         data = request.get_json()
@@ -161,53 +309,95 @@ def predict_batch():
         )
         if not is_valid:
             logger.warning(f"Invalid batch request: {error_msg}")
-            return jsonify({
+            return ojsonify({
                 "success": False,
                 "error": error_msg,
-                "timestamp": datetime.now().isoformat()
-            }), 400
+                "timestamp": _request_timestamp()
+            }, 400)
         
         # Extract parameters
         images = data.get('images', [])
-        use_tflite = data.get('use_tflite', False)
+        use_tflite = data.get('use_tflite')
+        detail = data.get('detail', 'full')
         
-        # Preprocess images
-        logger.info(f"Processing batch of {len(images)} images...")
-        image_arrays = []
+        # Group identical payloads so each distinct image is decoded and
+        # scored once; slots[pos] is the unique image used for position pos
+        slot_of = {}
+        slots = []
+        first_positions = []
+        for pos, img_data in enumerate(images):
+            slot = slot_of.get(img_data)
+            if slot is None:
+                slot = slot_of[img_data] = len(first_positions)
+                first_positions.append(pos)
+            slots.append(slot)
+        unique_images = list(slot_of)
         
-        for idx, img_data in enumerate(images):
+        # Preprocess images straight into one contiguous batch buffer
+        logger.info(
+            f"Processing batch of {len(images)} images "
+            f"({len(unique_images)} unique)..."
+        )
+        batch = image_processor.new_batch(len(unique_images))
+        valid_mask = np.zeros(len(unique_images), dtype=bool)
+        
+        # Decode in parallel; each task writes its own slot of the buffer
+        futures = [
+            _DECODE_POOL.submit(
+                image_processor.preprocess_image_into, img_data, batch[slot]
+            )
+            for slot, img_data in enumerate(unique_images)
+        ]
+        
+        for slot, future in enumerate(futures):
             try:
-                img_array = image_processor.preprocess_image(img_data)
-                image_arrays.append(img_array)
+                future.result()
+                valid_mask[slot] = True
             except Exception as e:
-                logger.error(f"Failed to process image {idx}: {e}")
+                logger.error(f"Failed to process image {first_positions[slot]}: {e}")
                 # Continue with other images
         
-        if not image_arrays:
-            return jsonify({
+        if not valid_mask.any():
+            return ojsonify({
                 "success": False,
                 "error": "No valid images in batch",
-                "timestamp": datetime.now().isoformat()
-            }), 400
+                "timestamp": _request_timestamp()
+            }, 400)
+        
+        if not valid_mask.all():
+            batch = batch[valid_mask]
         
         # Predict batch
-        logger.info(f"Making predictions for {len(image_arrays)} images...")
-        results = predictor.predict_batch(image_arrays, use_tflite=use_tflite)
+        logger.info(f"Making predictions for {len(batch)} images...")
+        slot_results = predictor.predict_batch(batch, use_tflite=use_tflite,
+                                               detail=detail)
+        
+        # Scatter results back to every position in the request payload
+        valid_slots = np.flatnonzero(valid_mask).tolist()
+        result_by_slot = {
+            valid_slots[result['image_index']]: result
+            for result in slot_results
+        }
+        results = [
+            dict(result_by_slot[slot], image_index=pos)
+            for pos, slot in enumerate(slots)
+            if slot in result_by_slot
+        ]
         
-        return jsonify({
+        return ojsonify({
             "success": True,
             "results": results,
             "total_processed": len(results),
-            "timestamp": datetime.now().isoformat()
-        }), 200
+            "timestamp": _request_timestamp()
+        }, 200)
         
     except Exception as e:
         logger.error(f"Batch prediction failed: {e}", exc_info=True)
-        return jsonify({
+        return ojsonify({
             "success": False,
             "error": "Internal server error during batch prediction",
-            "timestamp": datetime.now().isoformat()
-        }), 500
+            "timestamp": _request_timestamp()
+        }, 500)
 
 
 @api.route('/model/info', methods=['GET'])
@@ -218,22 +408,7 @@ def model_info():
     Returns:
         JSON: Model metadata
     """
-    try:
-        info = model_manager.get_model_info()
-        
-        return jsonify({
-            "success": True,
-            "model_info": info,
-            "timestamp": datetime.now().isoformat()
-        }), 200
-        
-    except Exception as e:
-        logger.error(f"Failed to get model info: {e}")
-        return jsonify({
-            "success": False,
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }), 500
+    return _frozen_response(_MODEL_INFO_JSON)
 
 
 @api.route('/classes', methods=['GET'])
@@ -244,49 +419,35 @@ def get_classes():
     Returns:
         JSON: List of disease classes
     """
-    try:
-        return jsonify({
-            "success": True,
-            "classes": model_manager.class_labels,
-            "num_classes": model_manager.num_classes,
-            "timestamp": datetime.now().isoformat()
-        }), 200
-        
-    except Exception as e:
-        logger.error(f"Failed to get classes: {e}")
-        return jsonify({
-            "success": False,
-            "error": str(e),
-            "timestamp": datetime.now().isoformat()
-        }), 500
+    return _frozen_response(_CLASSES_JSON)
 
 
 @api.errorhandler(404)
 def not_found(error):
     """Handle 404 errors"""
-    return jsonify({
+    return ojsonify({
         "success": False,
         "error": "Endpoint not found",
-        "timestamp": datetime.now().isoformat()
-    }), 404
+        "timestamp": _request_timestamp()
+    }, 404)
 
 
 @api.errorhandler(405)
 def method_not_allowed(error):
     """Handle 405 errors"""
-    return jsonify({
+    return ojsonify({
         "success": False,
         "error": "Method not allowed",
-        "timestamp": datetime.now().isoformat()
-    }), 405
+        "timestamp": _request_timestamp()
+    }, 405)
 
 
 @api.errorhandler(500)
 def internal_error(error):
     """Handle 500 errors"""
     logger.error(f"Internal server error: {error}")
-    return jsonify({
+    return ojsonify({
         "success": False,
         "error": "Internal server error",
-        "timestamp": datetime.now().isoformat()
-    }), 500
\ No newline at end of file
+        "timestamp": _request_timestamp()
+    }, 500)
\ No newline at end of file
@@ -9,14 +9,18 @@ Defines data structures for API
 """
 
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import List, Optional, Dict, Any
 
+import fastjsonschema
+from fastjsonschema import JsonSchemaException
+
 
 @dataclass
 class PredictionRequest:
     """Single image prediction request"""
     image: str  # Base64 encoded image
-    use_tflite: bool = False
+    use_tflite: Optional[bool] = None  # None: INT8 TFLite when loaded
     top_k: int = 3
 
 
@@ -24,7 +28,8 @@ class PredictionRequest:
 class BatchPredictionRequest:
     """Batch prediction request"""
     images: List[str]  # List of base64 encoded images
-    use_tflite: bool = False
+    use_tflite: Optional[bool] = None
+    detail: str = "full"  # "full" or "minimal" (disease + confidence)
 
 
 @dataclass
@@ -59,6 +64,45 @@ class ErrorResponse:
     timestamp: str = ""
 
 
+PREDICT_SCHEMA = {
+    "type": "object",
+    "required": ["image"],
+    "properties": {
+        "image": {"type": "string", "minLength": 1},
+        "use_tflite": {"type": "boolean"},
+        "top_k": {"type": "integer", "minimum": 1, "maximum": 10},
+    },
+}
+
+
+def batch_schema(max_batch_size: int) -> dict:
+    """Build the batch request schema for a given batch size limit"""
+    return {
+        "type": "object",
+        "required": ["images"],
+        "properties": {
+            "images": {
+                "type": "array",
+                "minItems": 1,
+                "maxItems": max_batch_size,
+                "items": {"type": "string", "minLength": 1},
+            },
+            "use_tflite": {"type": "boolean"},
+            "detail": {"enum": ["full", "minimal"]},
+        },
+    }
+
+
+# Validators are generated once; each call is a single specialized pass
+_validate_predict = fastjsonschema.compile(PREDICT_SCHEMA)
+
+
+@lru_cache(maxsize=8)
+def _batch_validator(max_batch_size: int):
+    """Compiled batch validator, cached per batch size limit"""
+    return fastjsonschema.compile(batch_schema(max_batch_size))
+
+
 def validate_prediction_request(data: dict) -> tuple:
     """
     Validate prediction request
@@ -69,20 +113,10 @@ def validate_prediction_request(data: dict) -> tuple:
     if not data:
         return False, "No data provided"
     
-    if 'image' not in data:
-        return False, "Missing 'image' field"
-    
-    if not data['image']:
-        return False, "Image data is empty"
-    
-    # Optional fields validation
-    if 'top_k' in data:
-        try:
-            top_k = int(data['top_k'])
-            if top_k < 1 or top_k > 10:
-                return False, "top_k must be between 1 and 10"
-        except (ValueError, TypeError):
-            return False, "top_k must be an integer"
+    try:
+        _validate_predict(data)
+    except JsonSchemaException as e:
+        return False, e.message
     
     return True, None
 
@@ -97,23 +131,9 @@ def validate_batch_request(data: dict, max_batch_size: int = 10) -> tuple:
     if not data:
         return False, "No data provided"
     
-    if 'images' not in data:
-        return False, "Missing 'images' field"
-    
-    images = data['images']
-    
-    if not isinstance(images, list):
-        return False, "'images' must be a list"
+    try:
+        _batch_validator(max_batch_size)(data)
+    except JsonSchemaException as e:
+        return False, e.message
     
-    if len(images) == 0:
-        return False, "'images' list is empty"
-    
-    if len(images) > max_batch_size:
-        return False, f"Batch size exceeds maximum of {max_batch_size}"
-    
-    # Check each image
-    for idx, img in enumerate(images):
-        if not img:
-            return False, f"Image at index {idx} is empty"
-    
-    return True, None
+    return True, None
\ No newline at end of file
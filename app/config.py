@@ -35,10 +35,27 @@ class Config:
     MODEL_PATH = MODEL_DIR / "crop_disease_final.h5"
     TFLITE_MODEL_PATH = MODEL_DIR / "crop_disease_mobile.tflite"
     CLASS_LABELS_PATH = MODEL_DIR / "class_labels.json"
+    MODEL_METADATA_PATH = MODEL_DIR / "model_metadata.json"  # Written by train_model.py
+    
+    # Inference Runtime
+    # Keep workers x threads close to the core count; 0 = TensorFlow default
+    INTRA_OP_THREADS = int(os.getenv("INTRA_OP_THREADS", 0))
+    INTER_OP_THREADS = int(os.getenv("INTER_OP_THREADS", 0))
+    TFLITE_NUM_THREADS = int(os.getenv("TFLITE_NUM_THREADS", os.cpu_count() or 1))
+    USE_GPU_DELEGATE = os.getenv("USE_GPU_DELEGATE", "False").lower() == "true"
+    GPU_DELEGATE_LIB = os.getenv("GPU_DELEGATE_LIB", "libtensorflowlite_gpu_delegate.so")
+    SERVE_TFLITE_ONLY = os.getenv("SERVE_TFLITE_ONLY", "False").lower() == "true"
     
     # Image Processing
     IMG_SIZE = (224, 224)
     MAX_IMAGE_SIZE_MB = int(os.getenv("MAX_IMAGE_SIZE_MB", 10))
+    # Scale pixels to [0, 1] before inference. Only used for models without
+    # a metadata file; scripts/train_model.py records that its models
+    # rescale raw 0-255 input themselves
+    NORMALIZE_INPUT = os.getenv("NORMALIZE_INPUT", "True").lower() == "true"
+    PREPROCESS_FUSED_KERNEL = os.getenv("PREPROCESS_FUSED_KERNEL", "False").lower() == "true"
+    PREPROCESS_CACHE_SIZE = int(os.getenv("PREPROCESS_CACHE_SIZE", 64))
+    PREPROCESS_REUSE_BUFFERS = os.getenv("PREPROCESS_REUSE_BUFFERS", "False").lower() == "true"
     ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png"}
     
     # Data Directories
@@ -48,6 +65,7 @@ class Config:
     TRAIN_DIR = PROCESSED_DATA_DIR / "train"
     VAL_DIR = PROCESSED_DATA_DIR / "validation"
     TEST_DIR = PROCESSED_DATA_DIR / "test"
+    TF_CACHE_DIR = PROCESSED_DATA_DIR / "tfcache"  # Decoded uint8 training images
     
     # Logging
     LOG_DIR = BASE_DIR / "logs"
@@ -60,14 +78,22 @@ class Config:
     FINE_TUNE_EPOCHS = int(os.getenv("FINE_TUNE_EPOCHS", 20))
     LEARNING_RATE = float(os.getenv("LEARNING_RATE", 0.001))
     FINE_TUNE_LR = float(os.getenv("FINE_TUNE_LR", 0.0001))
+    MIXED_PRECISION = os.getenv("MIXED_PRECISION", "True").lower() == "true"  # GPU only
+    XLA_JIT = os.getenv("XLA_JIT", "True").lower() == "true"  # XLA-compile training steps
     
     # Data Split Ratios
     TRAIN_RATIO = float(os.getenv("TRAIN_RATIO", 0.7))
     VAL_RATIO = float(os.getenv("VAL_RATIO", 0.15))
     TEST_RATIO = float(os.getenv("TEST_RATIO", 0.15))
+    PREP_JOBS = int(os.getenv("PREP_JOBS", (os.cpu_count() or 1) * 4))  # Parallel file copies
     
     # API Configuration
     MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 10))
+    
+    # Dynamic batching of concurrent single-image requests
+    BATCH_INFERENCE = os.getenv("BATCH_INFERENCE", "False").lower() == "true"
+    BATCH_INFERENCE_MAX_BATCH = int(os.getenv("BATCH_INFERENCE_MAX_BATCH", 16))
+    BATCH_INFERENCE_MAX_DELAY_MS = float(os.getenv("BATCH_INFERENCE_MAX_DELAY_MS", 5))
     REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 30))
     
     # Security
@@ -102,6 +128,7 @@ class ProductionConfig(Config):
     
     # Production-specific settings
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "").split(",")
+    SERVE_TFLITE_ONLY = os.getenv("SERVE_TFLITE_ONLY", "True").lower() == "true"
 
 
 class TestingConfig(Config):
@@ -3,7 +3,10 @@ Model Management
 Handles model loading and lifecycle
 """
 
-import json
+import threading
+import time
+import numpy as np
+import orjson
 import tensorflow as tf
 from pathlib import Path
 from typing import Optional, List
@@ -13,11 +16,63 @@ from app.utils.logger import get_logger
 logger = get_logger(__name__)
 
 
+def configure_tf_threading(intra_op_threads: int, inter_op_threads: int):
+    """
+    Set TensorFlow thread pool sizes (0 keeps the TensorFlow default)
+    
+    Must run before the TensorFlow runtime is initialized.
+    """
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        logger.warning(f"Could not configure TensorFlow threads: {e}")
+        return
+    
+    logger.info(
+        f"TensorFlow threads: intra_op={intra_op_threads or 'default'}, "
+        f"inter_op={inter_op_threads or 'default'}"
+    )
+
+
+def load_model_metadata(path: Path) -> dict:
+    """
+    Read the metadata file saved next to a trained model
+    
+    Returns an empty dict when there is none (models exported before
+    metadata was recorded).
+    """
+    path = Path(path)
+    if not path.exists():
+        return {}
+    return orjson.loads(path.read_bytes())
+
+
+def save_model_metadata(path: Path, normalize_input: bool):
+    """
+    Record how a trained model's input must be preprocessed
+    
+    Args:
+        path: Metadata file to write
+        normalize_input: True if the model expects pixels scaled to
+            [0, 1], False if it takes raw 0-255 pixels
+    """
+    Path(path).write_bytes(orjson.dumps(
+        {"normalize_input": normalize_input}, option=orjson.OPT_INDENT_2
+    ))
+
+
 class ModelManager:
     """Manages ML model loading and metadata"""
     
     def __init__(self, model_path: Path, class_labels_path: Path, 
-                 tflite_path: Optional[Path] = None):
+                 tflite_path: Optional[Path] = None,
+                 tflite_num_threads: Optional[int] = None,
+                 gpu_delegate_lib: Optional[str] = None,
+                 load_keras: bool = True,
+                 metadata_path: Optional[Path] = None):
         """
         Initialize model manager
         
@@ -25,56 +80,223 @@ class ModelManager:
             model_path: Path to Keras model (.h5)
             class_labels_path: Path to class labels JSON
             tflite_path: Optional path to TFLite model
+            tflite_num_threads: Threads for TFLite kernels (None = TFLite default)
+            gpu_delegate_lib: Optional TFLite GPU delegate library to load
+            load_keras: Load the Keras model (False = TFLite-only serving)
+            metadata_path: Optional model metadata JSON (see
+                save_model_metadata)
         """
         self.model_path = model_path
         self.class_labels_path = class_labels_path
         self.tflite_path = tflite_path
+        self.tflite_num_threads = tflite_num_threads
+        self.gpu_delegate_lib = gpu_delegate_lib
+        self.load_keras = load_keras
+        self.metadata_path = metadata_path
         
         self.keras_model = None
+        self._keras_fn = None
         self.tflite_interpreter = None
+        self.gpu_delegate = None
         self.tflite_input_details = None
         self.tflite_output_details = None
-        self.class_labels = []
+        self._tflite_batch_size = None
+        # The interpreter holds one set of tensors; serialize access to it
+        self._tflite_lock = threading.Lock()
+        self.class_labels = ()
+        self.class_labels_json = b"[]"
         self.num_classes = 0
+        # None until known from the metadata file
+        self.normalize_input = None
         
         self._load_models()
         self._load_class_labels()
+        self._load_metadata()
+        
+        # Everything reported by get_model_info is fixed after loading
+        self._model_info = self._compute_model_info()
     
     def _load_models(self):
         """Load Keras and TFLite models"""
         # Load Keras model
         try:
-            if self.model_path.exists():
+            if not self.load_keras:
+                logger.info("TFLite-only serving: skipping Keras model")
+            elif self.model_path.exists():
                 logger.info(f"Loading Keras model from {self.model_path}")
                 self.keras_model = tf.keras.models.load_model(str(self.model_path))
+                self._keras_fn = self._build_keras_fn()
                 logger.info("✓ Keras model loaded successfully")
             else:
                 logger.warning(f"Keras model not found at {self.model_path}")
         except Exception as e:
             logger.error(f"Failed to load Keras model: {e}")
             self.keras_model = None
+            self._keras_fn = None
+        
+        if self.keras_model is not None:
+            self._warmup_keras()
         
         # Load TFLite model
+        self._load_tflite_model()
+    
+    def _load_tflite_model(self):
+        """Create the TFLite interpreter and warm it up"""
         if self.tflite_path and self.tflite_path.exists():
             try:
                 logger.info(f"Loading TFLite model from {self.tflite_path}")
-                self.tflite_interpreter = tf.lite.Interpreter(
-                    model_path=str(self.tflite_path)
-                )
-                self.tflite_interpreter.allocate_tensors()
+                self.tflite_interpreter = self._create_tflite_interpreter()
                 self.tflite_input_details = self.tflite_interpreter.get_input_details()
                 self.tflite_output_details = self.tflite_interpreter.get_output_details()
-                logger.info("✓ TFLite model loaded successfully")
+                self._tflite_batch_size = int(self.tflite_input_details[0]['shape'][0])
+                logger.info(
+                    f"✓ TFLite model loaded successfully "
+                    f"(threads={self.tflite_num_threads or 'default'}, "
+                    f"gpu_delegate={self.gpu_delegate is not None})"
+                )
             except Exception as e:
                 logger.error(f"Failed to load TFLite model: {e}")
                 self.tflite_interpreter = None
+        
+        if self.tflite_interpreter is not None:
+            self._warmup_tflite()
+    
+    def reload_tflite_interpreter(self):
+        """
+        Recreate the TFLite interpreter in a forked worker process
+        
+        Threads do not survive fork(), so an interpreter inherited from a
+        preloading parent must not be reused. The model file is mmapped,
+        so its pages stay shared between workers.
+        """
+        if self.tflite_interpreter is None:
+            return
+        
+        self._tflite_lock = threading.Lock()
+        self.tflite_interpreter = None
+        self.gpu_delegate = None
+        self._load_tflite_model()
+    
+    def _build_keras_fn(self):
+        """
+        Trace the Keras model once as a graph function
+        
+        Calling the traced function skips the per-call setup of
+        model.predict(); the None batch dimension lets one trace
+        serve every batch size.
+        """
+        model = self.keras_model
+        input_spec = tf.TensorSpec([None, *model.input_shape[1:]], tf.float32)
+        
+        @tf.function(input_signature=[input_spec])
+        def serve(images):
+            return model(images, training=False)
+        
+        return serve
+    
+    def _warmup_keras(self):
+        """Trace the Keras graph at startup instead of on the first request"""
+        try:
+            shape = [1] + [dim or 1 for dim in self.keras_model.input_shape[1:]]
+            start = time.perf_counter()
+            self._keras_fn(np.zeros(shape, dtype=np.float32))
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            logger.info(f"✓ Keras warm-up done ({elapsed_ms:.1f} ms)")
+        except Exception as e:
+            logger.warning(f"Keras warm-up failed: {e}")
+    
+    def _warmup_tflite(self, runs: int = 2):
+        """
+        Run dummy invocations so kernel selection and delegate compilation
+        happen at startup instead of on the first request
+        """
+        try:
+            input_detail = self.tflite_input_details[0]
+            dummy = np.zeros(input_detail['shape'], dtype=input_detail['dtype'])
+            
+            start = time.perf_counter()
+            with self._tflite_lock:
+                for _ in range(runs):
+                    self.tflite_interpreter.set_tensor(input_detail['index'], dummy)
+                    self.tflite_interpreter.invoke()
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            
+            logger.info(f"✓ TFLite warm-up done ({runs} runs, {elapsed_ms:.1f} ms)")
+        except Exception as e:
+            logger.warning(f"TFLite warm-up failed: {e}")
+    
+    def _create_tflite_interpreter(self):
+        """
+        Create TFLite interpreter, preferring the GPU delegate if configured
+        
+        Falls back to the CPU (XNNPACK) interpreter when the delegate
+        library cannot be loaded or applied.
+        """
+        if self.gpu_delegate_lib:
+            try:
+                delegate = tf.lite.experimental.load_delegate(
+                    self.gpu_delegate_lib,
+                    options={
+                        'inference_preference': 'sustained_speed',
+                        'precision_loss_allowed': 1,
+                    }
+                )
+                interpreter = tf.lite.Interpreter(
+                    model_path=str(self.tflite_path),
+                    num_threads=self.tflite_num_threads,
+                    experimental_delegates=[delegate]
+                )
+                interpreter.allocate_tensors()
+                # Keep a reference so the delegate outlives the interpreter
+                self.gpu_delegate = delegate
+                self._log_delegate_partitions(interpreter)
+                return interpreter
+            except Exception as e:
+                logger.warning(
+                    f"GPU delegate unavailable ({self.gpu_delegate_lib}): {e}. "
+                    f"Falling back to CPU"
+                )
+                self.gpu_delegate = None
+        
+        # BUILTIN resolver applies the XNNPACK delegate by default,
+        # so conv/depthwise/FC ops run on its SIMD kernels
+        interpreter = tf.lite.Interpreter(
+            model_path=str(self.tflite_path),
+            num_threads=self.tflite_num_threads,
+            experimental_op_resolver_type=(
+                tf.lite.experimental.OpResolverType.BUILTIN
+            )
+        )
+        interpreter.allocate_tensors()
+        return interpreter
+    
+    def _log_delegate_partitions(self, interpreter):
+        """Log how many graph partitions were handed to the delegate"""
+        try:
+            ops = interpreter._get_ops_details()
+        except Exception:
+            return
+        
+        partitions = sum(1 for op in ops if op.get('op_name') == 'DELEGATE')
+        cpu_ops = len(ops) - partitions
+        logger.info(
+            f"GPU delegate partitions: {partitions}, ops left on CPU: {cpu_ops}"
+        )
+        if partitions > 1 or cpu_ops > 0:
+            logger.warning(
+                "Model graph is fragmented across GPU/CPU; "
+                "expect transfer overhead at partition boundaries"
+            )
     
     def _load_class_labels(self):
         """Load class labels from JSON"""
         try:
             if self.class_labels_path.exists():
-                with open(self.class_labels_path, 'r') as f:
-                    self.class_labels = json.load(f)
+                data = self.class_labels_path.read_bytes()
+                # Immutable tuple; the raw bytes are kept so API responses
+                # can embed them without re-encoding
+                self.class_labels = tuple(orjson.loads(data))
+                self.class_labels_json = data
                 self.num_classes = len(self.class_labels)
                 logger.info(f"✓ Loaded {self.num_classes} class labels")
             else:
@@ -91,12 +313,30 @@ class ModelManager:
                len(self.class_labels) > 0
     
     def get_model_info(self) -> dict:
-        """Get model information"""
+        """Get model information (computed once at load time)"""
+        return self._model_info
+    
+    def _load_metadata(self):
+        """Load how the model's input must be preprocessed, if recorded"""
+        if self.metadata_path is None:
+            return
+        metadata = load_model_metadata(self.metadata_path)
+        self.normalize_input = metadata.get("normalize_input")
+        if self.normalize_input is not None:
+            logger.info(f"✓ Model metadata loaded (normalize_input={self.normalize_input})")
+        else:
+            logger.warning(f"No model metadata at {self.metadata_path}")
+    
+    def _compute_model_info(self) -> dict:
+        """Collect model metadata"""
         info = {
             "num_classes": self.num_classes,
             "class_labels": self.class_labels,
             "keras_available": self.keras_model is not None,
             "tflite_available": self.tflite_interpreter is not None,
+            "tflite_quantized": self.tflite_quantized,
+            "input_data_format": self.input_data_format,
+            "normalize_input": self.normalize_input,
         }
         
         if self.keras_model:
@@ -108,6 +348,32 @@ class ModelManager:
         
         return info
     
+    @property
+    def input_data_format(self) -> str:
+        """
+        Image layout the loaded model expects
+        
+        "channels_first" when the input is (N, 3, H, W), e.g. a model
+        built for NCHW on GPU; "channels_last" (NHWC) otherwise.
+        """
+        if self.keras_model is not None:
+            shape = self.keras_model.input_shape
+        elif self.tflite_interpreter is not None:
+            shape = tuple(self.tflite_input_details[0]['shape'])
+        else:
+            return "channels_last"
+        
+        if len(shape) == 4 and shape[1] == 3 and shape[3] != 3:
+            return "channels_first"
+        return "channels_last"
+    
+    @property
+    def tflite_quantized(self) -> bool:
+        """True when a loaded TFLite model takes integer-quantized input"""
+        if self.tflite_interpreter is None:
+            return False
+        return self.tflite_input_details[0]['dtype'] != np.float32
+    
     def get_class_label(self, index: int) -> str:
         """Get class label by index"""
         if 0 <= index < len(self.class_labels):
@@ -127,8 +393,28 @@ class ModelManager:
         if self.keras_model is None:
             raise RuntimeError("Keras model not loaded")
         
-        predictions = self.keras_model.predict(image_array, verbose=0)
-        return predictions[0]
+        predictions = self._keras_fn(
+            np.asarray(image_array, dtype=np.float32)
+        )
+        return predictions.numpy()[0]
+    
+    def predict_keras_batch(self, batch_array: np.ndarray) -> np.ndarray:
+        """
+        Predict a batch with a single Keras call
+        
+        Args:
+            batch_array: Stacked preprocessed images (N, H, W, 3)
+            
+        Returns:
+            np.ndarray: Prediction probabilities (N, num_classes)
+        """
+        if self.keras_model is None:
+            raise RuntimeError("Keras model not loaded")
+        
+        predictions = self._keras_fn(
+            np.asarray(batch_array, dtype=np.float32)
+        )
+        return predictions.numpy()
     
     def predict_tflite(self, image_array):
         """
@@ -138,17 +424,83 @@ class ModelManager:
             image_array: Preprocessed image array
             
         Returns:
-            np.ndarray: Prediction probabilities
+            np.ndarray: Prediction probabilities; owned by the caller and
+                safe to keep across later invocations
+        """
+        if self.tflite_interpreter is None:
+            raise RuntimeError("TFLite model not loaded")
+        
+        with self._tflite_lock:
+            return self._invoke_tflite(image_array)[0]
+    
+    def predict_tflite_batch(self, batch_array: np.ndarray) -> np.ndarray:
+        """
+        Predict a batch with a single TFLite invocation
+        
+        Args:
+            batch_array: Stacked preprocessed images (N, H, W, 3)
+            
+        Returns:
+            np.ndarray: Prediction probabilities (N, num_classes)
         """
         if self.tflite_interpreter is None:
             raise RuntimeError("TFLite model not loaded")
         
+        with self._tflite_lock:
+            return self._invoke_tflite(batch_array)
+    
+    def _invoke_tflite(self, batch_array: np.ndarray) -> np.ndarray:
+        """Run the interpreter on a batch; caller must hold the lock"""
+        self._resize_tflite_batch(len(batch_array))
         self.tflite_interpreter.set_tensor(
             self.tflite_input_details[0]['index'],
-            image_array.astype('float32')
+            self._quantize_input(batch_array)
         )
         self.tflite_interpreter.invoke()
-        predictions = self.tflite_interpreter.get_tensor(
+        # tensor() is a zero-copy view of the output buffer that is only valid
+        # until the next invoke/resize, so exactly one owned array is made
+        # from it while the lock is held (get_tensor() would add a copy)
+        output = self.tflite_interpreter.tensor(
             self.tflite_output_details[0]['index']
-        )
-        return predictions[0]
\ No newline at end of file
+        )()
+        return self._dequantize_output(output)
+    
+    def _resize_tflite_batch(self, batch_size: int):
+        """Resize the interpreter input when the batch size changes"""
+        if batch_size == self._tflite_batch_size:
+            return
+        
+        input_detail = self.tflite_input_details[0]
+        shape = list(input_detail['shape'])
+        shape[0] = batch_size
+        self.tflite_interpreter.resize_tensor_input(input_detail['index'], shape)
+        self.tflite_interpreter.allocate_tensors()
+        self._tflite_batch_size = batch_size
+        logger.debug(f"TFLite input resized to batch size {batch_size}")
+    
+    def _quantize_input(self, image_array: np.ndarray) -> np.ndarray:
+        """Convert a float input to the interpreter's input dtype"""
+        detail = self.tflite_input_details[0]
+        dtype = detail['dtype']
+        if dtype == np.float32:
+            return image_array.astype(np.float32, copy=False)
+        
+        # Integer-quantized model: real = (q - zero_point) * scale
+        scale, zero_point = detail['quantization']
+        limits = np.iinfo(dtype)
+        quantized = np.round(image_array / scale + zero_point)
+        return np.clip(quantized, limits.min, limits.max).astype(dtype)
+    
+    def _dequantize_output(self, predictions: np.ndarray) -> np.ndarray:
+        """
+        Convert the interpreter's output to an owned float32 array
+        
+        Args:
+            predictions: View of the interpreter's output tensor
+        """
+        detail = self.tflite_output_details[0]
+        if detail['dtype'] == np.float32:
+            return predictions.copy()
+        
+        scale, zero_point = detail['quantization']
+        return (predictions.astype(np.float32) - zero_point) * scale
@@ -4,109 +4,183 @@ Handles disease prediction and result processing
 """
 
 import numpy as np
-from typing import Dict, List, Tuple
-from datetime import datetime
+from bisect import bisect_right
+from functools import lru_cache
+from typing import Dict, List, Literal, Optional, Tuple, Union
 
 from app.core.model import ModelManager
-from app.data.disease_info import DiseaseDatabase
+from app.data.disease_info import DiseaseDatabase, normalize_disease_key
 from app.utils.logger import get_logger
+from app.utils.time_utils import iso_now
 
 logger = get_logger(__name__)
 
+# "full": top-k, severity and disease information; "minimal": class and
+# confidence only
+Detail = Literal["full", "minimal"]
+DETAIL_LEVELS = ("full", "minimal")
+
 
 class DiseasePredictor:
     """Handles disease prediction logic"""
     
     def __init__(self, model_manager: ModelManager, 
-                 disease_db: DiseaseDatabase):
+                 disease_db: DiseaseDatabase,
+                 batch_service=None,
+                 image_processor=None):
         """
         Initialize predictor
         
         Args:
             model_manager: ModelManager instance
             disease_db: DiseaseDatabase instance
+            batch_service: Optional BatchInferenceService; when set,
+                single-image predictions are coalesced into batches
+            image_processor: ImageProcessor used by predict_image when
+                there is no batch service
         """
         self.model_manager = model_manager
         self.disease_db = disease_db
+        self.batch_service = batch_service
+        self.image_processor = image_processor
+        
+        # Labels resolved once; indexed directly when building results
+        self._labels = list(model_manager.class_labels)
     
     def predict(self, image_array: np.ndarray, 
-                use_tflite: bool = False,
-                top_k: int = 3) -> Dict:
+                use_tflite: Optional[bool] = None,
+                top_k: int = 3,
+                detail: Detail = "full") -> Dict:
         """
         Predict disease from image
         
         Args:
             image_array: Preprocessed image array (1, H, W, 3)
-            use_tflite: Use TFLite model instead of Keras
+            use_tflite: Use TFLite model instead of Keras; None picks
+                TFLite when an INT8-quantized model is loaded
             top_k: Number of top predictions to return
+            detail: "full" response, or "minimal" (disease and
+                confidence only; top_k is ignored)
             
         Returns:
             dict: Prediction results with disease information
         """
+        _check_detail(detail)
+        
         try:
             # Get predictions
-            if use_tflite and self.model_manager.tflite_interpreter:
+            model_used = self._select_model(use_tflite)
+            if self.batch_service is not None:
+                logger.info(f"Queueing {model_used} prediction for batching")
+                predictions = self.batch_service.wait(
+                    self.batch_service.infer(image_array, model_used)
+                )
+            elif model_used == "tflite":
                 logger.info("Using TFLite model for prediction")
                 predictions = self.model_manager.predict_tflite(image_array)
-            elif self.model_manager.keras_model:
+            else:
                 logger.info("Using Keras model for prediction")
                 predictions = self.model_manager.predict_keras(image_array)
-            else:
-                raise RuntimeError("No model available for prediction")
-            
-            # Get top predictions
-            top_predictions = self._get_top_predictions(predictions, top_k)
-            
-            # Get primary prediction
-            primary = top_predictions[0]
-            primary_class = primary['class']
-            primary_confidence = primary['confidence']
-            
-            # Assess severity
-            severity = self._assess_severity(primary_confidence)
-            
-            # Get disease information
-            disease_info = self._get_disease_information(primary_class)
-            
-            # Build response
-            result = {
-                "success": True,
-                "timestamp": datetime.now().isoformat(),
-                "model_used": "tflite" if use_tflite else "keras",
-                "primary_prediction": {
-                    "disease": primary_class,
-                    "confidence": float(primary_confidence),
-                    "confidence_percentage": f"{primary_confidence * 100:.2f}%",
-                    "severity": severity,
-                },
-                "alternative_predictions": top_predictions[1:],
-                "disease_information": disease_info,
-            }
             
-            logger.info(f"Prediction complete: {primary_class} ({primary_confidence:.2%})")
-            return result
+            return self._build_result(predictions, model_used, top_k,
+                                      detail=detail)
             
         except Exception as e:
             logger.error(f"Prediction failed: {e}", exc_info=True)
             raise
     
-    def predict_batch(self, image_arrays: List[np.ndarray],
-                     use_tflite: bool = False) -> List[Dict]:
+    def predict_image(self, image_data,
+                      use_tflite: Optional[bool] = None,
+                      top_k: int = 3,
+                      detail: Detail = "full") -> Dict:
         """
-        Predict multiple images
+        Preprocess and predict one image
+        
+        With a batch service, preprocessing runs on the service's worker
+        pool and inference is coalesced with concurrent requests, so the
+        calling (request) thread only waits for the result.
         
         Args:
-            image_arrays: List of preprocessed image arrays
-            use_tflite: Use TFLite model
+            image_data: Anything ImageProcessor.preprocess_image accepts
+            use_tflite: Use TFLite model instead of Keras; None picks
+                TFLite when an INT8-quantized model is loaded
+            top_k: Number of top predictions to return
+            detail: "full" response, or "minimal"
+            
+        Returns:
+            dict: Prediction results with disease information
+            
+        Raises:
+            ValueError: If the image cannot be preprocessed
+        """
+        if self.batch_service is None:
+            image_array = self.image_processor.preprocess_image(image_data)
+            return self.predict(image_array, use_tflite=use_tflite,
+                                top_k=top_k, detail=detail)
+        
+        _check_detail(detail)
+        model_used = self._select_model(use_tflite)
+        logger.info(f"Submitting {model_used} prediction for batching")
+        predictions = self.batch_service.wait(
+            self.batch_service.submit(image_data, model_used)
+        )
+        return self._build_result(predictions, model_used, top_k,
+                                  detail=detail)
+    
+    def predict_batch(self, image_arrays: Union[np.ndarray, List[np.ndarray]],
+                     use_tflite: Optional[bool] = None,
+                     top_k: int = 1,
+                     detail: Detail = "full") -> List[Dict]:
+        """
+        Predict multiple images with a single model invocation
+        
+        Args:
+            image_arrays: Stacked preprocessed images (N, H, W, 3), or a
+                list of preprocessed image arrays (1, H, W, 3)
+            use_tflite: Use TFLite model; None picks TFLite when an
+                INT8-quantized model is loaded
+            top_k: Number of top predictions per image
+            detail: "full" responses, or "minimal" (disease and
+                confidence only; top_k is ignored)
             
         Returns:
             list: List of prediction results
         """
+        _check_detail(detail)
+        if detail == "minimal":
+            top_k = 1
+        
+        if not isinstance(image_arrays, np.ndarray):
+            shapes = {arr.shape[1:] for arr in image_arrays}
+            if len(shapes) > 1:
+                raise ValueError(f"Batch images have mismatched shapes: {shapes}")
+            image_arrays = np.concatenate(image_arrays, axis=0)
+        
+        model_used = self._select_model(use_tflite)
+        try:
+            if model_used == "tflite":
+                batch_predictions = self.model_manager.predict_tflite_batch(image_arrays)
+            else:
+                batch_predictions = self.model_manager.predict_keras_batch(image_arrays)
+        except Exception as e:
+            logger.error(f"Batch prediction failed: {e}", exc_info=True)
+            return [
+                {"success": False, "image_index": idx, "error": str(e)}
+                for idx in range(len(image_arrays))
+            ]
+        
+        # Top-k for every row at once; one timestamp for the whole batch
+        batch_top_indices = self._top_indices(batch_predictions, top_k)
+        timestamp = iso_now()
         results = []
         
-        for idx, image_array in enumerate(image_arrays):
+        for idx, (predictions, top_indices) in enumerate(
+                zip(batch_predictions, batch_top_indices)):
             try:
-                result = self.predict(image_array, use_tflite, top_k=1)
+                result = self._build_result(predictions, model_used, top_k,
+                                            timestamp=timestamp,
+                                            top_indices=top_indices,
+                                            detail=detail)
                 result['image_index'] = idx
                 results.append(result)
             except Exception as e:
@@ -119,39 +193,151 @@ class DiseasePredictor:
         
         return results
     
+    def _build_result(self, predictions: np.ndarray, model_used: str,
+                      top_k: int, timestamp: Optional[str] = None,
+                      top_indices: Optional[np.ndarray] = None,
+                      detail: Detail = "full") -> Dict:
+        """
+        Build the prediction response for one image
+        
+        Args:
+            predictions: Prediction probabilities array
+            model_used: Name of the model that produced the predictions
+            top_k: Number of top predictions to return
+            timestamp: ISO timestamp to report (defaults to the current
+                second)
+            top_indices: Precomputed top-k class indices, best first
+            detail: "full", or "minimal" to skip everything but the
+                primary class and its confidence
+            
+        Returns:
+            dict: Prediction results with disease information
+        """
+        if detail == "minimal":
+            return self._build_minimal_result(predictions, model_used,
+                                              top_indices)
+        
+        # Get top predictions
+        top_predictions = self._get_top_predictions(predictions, top_k,
+                                                    top_indices)
+        
+        # Get primary prediction
+        primary = top_predictions[0]
+        primary_class = primary['class']
+        primary_confidence = primary['confidence']
+        
+        # Assess severity
+        severity = self._assess_severity(primary_confidence)
+        
+        # Get disease information
+        disease_info = self._get_disease_information(primary_class)
+        
+        # Build response
+        result = {
+            "success": True,
+            "timestamp": timestamp or iso_now(),
+            "model_used": model_used,
+            "primary_prediction": {
+                "disease": primary_class,
+                "confidence": primary_confidence,
+                "severity": severity,
+            },
+            "alternative_predictions": top_predictions[1:],
+            "disease_information": disease_info,
+        }
+        
+        logger.info("Prediction complete: %s (%.2f%%)",
+                    primary_class, primary_confidence * 100)
+        return result
+    
+    def _build_minimal_result(self, predictions: np.ndarray, model_used: str,
+                              top_indices: Optional[np.ndarray] = None) -> Dict:
+        """Build a class + confidence result, skipping disease lookups"""
+        if top_indices is None:
+            idx = int(np.argmax(predictions))
+        else:
+            idx = int(top_indices[0])
+        return {
+            "success": True,
+            "model_used": model_used,
+            "disease": (self._labels[idx] if idx < len(self._labels)
+                        else self.model_manager.get_class_label(idx)),
+            "confidence": predictions[idx].item(),
+        }
+    
+    def _select_model(self, use_tflite: Optional[bool]) -> str:
+        """
+        Choose which model serves a prediction
+        
+        use_tflite=None defaults to the INT8 TFLite model when one is
+        loaded. Falls back to TFLite when the Keras model is not loaded
+        (TFLite-only serving).
+        
+        Returns:
+            str: "tflite" or "keras"
+        """
+        if use_tflite is None:
+            use_tflite = self.model_manager.tflite_quantized
+        has_tflite = self.model_manager.tflite_interpreter is not None
+        if use_tflite and has_tflite:
+            return "tflite"
+        if self.model_manager.keras_model is not None:
+            return "keras"
+        if has_tflite:
+            return "tflite"
+        raise RuntimeError("No model available for prediction")
+    
     def _get_top_predictions(self, predictions: np.ndarray, 
-                            top_k: int) -> List[Dict]:
+                            top_k: int,
+                            top_indices: Optional[np.ndarray] = None) -> List[Dict]:
         """
         Get top K predictions
         
         Args:
             predictions: Prediction probabilities array
             top_k: Number of top predictions
+            top_indices: Precomputed top-k class indices, best first
             
         Returns:
             list: Top K predictions with class names and confidences
         """
-        # Ensure top_k doesn't exceed number of classes
-        top_k = min(top_k, len(predictions))
+        if top_indices is None:
+            top_indices = self._top_indices(predictions, top_k)
         
-        # Get top indices
-        top_indices = np.argsort(predictions)[-top_k:][::-1]
+        # Convert to Python ints/floats in one call each
+        indices = top_indices.tolist()
+        confidences = predictions[top_indices].tolist()
         
         # Build results
+        labels = self._labels
+        num_labels = len(labels)
         top_predictions = []
-        for idx in top_indices:
-            class_name = self.model_manager.get_class_label(int(idx))
-            confidence = float(predictions[idx])
-            
+        for idx, confidence in zip(indices, confidences):
             top_predictions.append({
-                "class": class_name,
-                "class_index": int(idx),
-                "confidence": confidence,
-                "confidence_percentage": f"{confidence * 100:.2f}%"
+                "class": (labels[idx] if idx < num_labels
+                          else self.model_manager.get_class_label(idx)),
+                "class_index": idx,
+                "confidence": confidence
             })
         
         return top_predictions
     
+    @staticmethod
+    def _top_indices(predictions: np.ndarray, top_k: int) -> np.ndarray:
+        """
+        Indices of the top K classes, best first
+        
+        Works on one prediction vector (C,) or a batch (N, C): a partial
+        selection of the top K (O(C) per row), then a sort of only those K.
+        """
+        # Ensure top_k doesn't exceed number of classes
+        top_k = min(top_k, predictions.shape[-1])
+        
+        top_indices = np.argpartition(predictions, -top_k, axis=-1)[..., -top_k:]
+        top_values = np.take_along_axis(predictions, top_indices, axis=-1)
+        order = np.argsort(-top_values, axis=-1)
+        return np.take_along_axis(top_indices, order, axis=-1)
+    
     def _assess_severity(self, confidence: float) -> str:
         """
         Assess prediction severity based on confidence
@@ -162,14 +348,7 @@ class DiseasePredictor:
         Returns:
             str: Severity level
         """
-        if confidence < 0.5:
-            return "uncertain"
-        elif confidence < 0.7:
-            return "mild"
-        elif confidence < 0.85:
-            return "moderate"
-        else:
-            return "severe"
+        return assess_severity(confidence)
     
     def _get_disease_information(self, class_name: str) -> Dict:
         """
@@ -207,11 +386,7 @@ class DiseasePredictor:
             "Tomato_Early_blight" -> "tomato_early_blight"
             "Pepper__bell___healthy" -> "pepper_bell_healthy"
         """
-        # Remove multiple underscores and convert to lowercase
-        normalized = class_name.lower()
-        while "__" in normalized:
-            normalized = normalized.replace("__", "_")
-        return normalized.strip("_")
+        return normalize_disease_key(class_name)
     
     def _extract_crop_name(self, class_name: str) -> str:
         """
@@ -223,8 +398,33 @@ class DiseasePredictor:
         Returns:
             str: Crop name
         """
-        # Common patterns: "Tomato_Disease", "Pepper__bell___Disease"
-        parts = class_name.split("_")
-        if parts:
-            return parts[0].capitalize()
-        return "Unknown"
\ No newline at end of file
+        return extract_crop_name(class_name)
+
+
+def _check_detail(detail: str):
+    """Reject unknown detail levels before doing any work"""
+    if detail not in DETAIL_LEVELS:
+        raise ValueError(f"detail must be one of {DETAIL_LEVELS}, got {detail!r}")
+
+
+# Upper bounds of the "uncertain", "mild" and "moderate" confidence bands
+_SEVERITY_THRESHOLDS = (0.5, 0.7, 0.85)
+_SEVERITY_LEVELS = ("uncertain", "mild", "moderate", "severe")
+
+
+def assess_severity(confidence: float) -> str:
+    """Map a prediction confidence (0-1) to a severity level"""
+    return _SEVERITY_LEVELS[bisect_right(_SEVERITY_THRESHOLDS, confidence)]
+
+
+@lru_cache(maxsize=256)
+def extract_crop_name(class_name: str) -> str:
+    """
+    Extract crop name from class name
+    
+    Common patterns: "Tomato_Disease", "Pepper__bell___Disease"
+    """
+    parts = class_name.split("_")
+    if parts:
+        return parts[0].capitalize()
+    return "Unknown"
@@ -0,0 +1,50 @@
+"""
+Dataset Manifests
+Split listings written by scripts/prepare_data.py instead of copying images
+"""
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Union
+
+import orjson
+
+# Split names, in the order prepare_data.py fills them
+SPLITS = ("train", "validation", "test")
+
+
+@dataclass(frozen=True)
+class Manifest:
+    """
+    One dataset split: image paths with integer labels
+    
+    labels[i] indexes class_names, which is sorted the same way as the
+    class subdirectories (and class_labels.json).
+    """
+    class_names: List[str]
+    paths: List[str]
+    labels: List[int]
+
+
+def manifest_path(data_dir: Union[str, Path], split: str) -> Path:
+    """Location of a split's manifest inside the processed data directory"""
+    return Path(data_dir) / f"{split}.json"
+
+
+def write_manifest(path: Union[str, Path], manifest: Manifest):
+    """Write a manifest as JSON"""
+    Path(path).write_bytes(orjson.dumps({
+        "class_names": manifest.class_names,
+        "paths": manifest.paths,
+        "labels": manifest.labels,
+    }))
+
+
+def load_manifest(path: Union[str, Path]) -> Manifest:
+    """Read a manifest written by write_manifest"""
+    data = orjson.loads(Path(path).read_bytes())
+    return Manifest(
+        class_names=data["class_names"],
+        paths=data["paths"],
+        labels=data["labels"],
+    )
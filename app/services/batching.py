@@ -0,0 +1,223 @@
+"""
+Batch Inference Service
+Coalesces concurrent single-image requests into batched model calls
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import (Future, InvalidStateError, ThreadPoolExecutor,
+                                TimeoutError)
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BatchInferenceService:
+    """
+    Producer-consumer pipeline in front of the ModelManager
+    
+    Preprocessing runs on a thread pool; preprocessed tensors go into a
+    bounded queue drained by a single inference thread, which stacks up
+    to max_batch of them (waiting at most max_delay_ms for stragglers)
+    and runs the model once per batch. Each caller gets a Future that
+    resolves to its own row of predictions.
+    
+    Threads are started on first use and restarted in a forked child,
+    so the service is safe to build before gunicorn forks its workers.
+    """
+    
+    def __init__(self, model_manager, image_processor=None,
+                 max_batch: int = 16,
+                 max_delay_ms: float = 5.0,
+                 queue_size: int = 64,
+                 num_workers: Optional[int] = None,
+                 timeout: Optional[float] = 30.0):
+        """
+        Initialize batch inference service
+        
+        Args:
+            model_manager: ModelManager instance
+            image_processor: ImageProcessor used by submit()
+            max_batch: Maximum images per model call
+            max_delay_ms: Longest time to wait for a batch to fill
+            queue_size: Maximum queued tensors (callers block when full)
+            num_workers: Preprocessing threads (default: CPU count)
+            timeout: Seconds wait() blocks for a result (None = forever)
+        """
+        self.model_manager = model_manager
+        self.image_processor = image_processor
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000.0
+        self.queue_size = queue_size
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.timeout = timeout
+        
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._pool = None
+        self._thread = None
+    
+    def submit(self, image_data, model_used: str) -> Future:
+        """
+        Preprocess on the pool, then queue for batched inference
+        
+        Args:
+            image_data: Anything ImageProcessor.preprocess_image accepts
+            model_used: "tflite" or "keras"
+        
+        Returns:
+            Future: Resolves to the image's prediction probabilities
+        """
+        self._ensure_started()
+        result = Future()
+        
+        def preprocess():
+            try:
+                image_array = self.image_processor.preprocess_image(image_data)
+            except Exception as e:
+                _fail(result, e)
+                return
+            # The row may be a view of this thread's reused scratch buffer
+            # (reuse_buffers), which its next preprocess overwrites before
+            # the inference thread stacks the batch
+            self._queue.put((np.array(image_array[0]), model_used, result))
+        
+        self._pool.submit(preprocess)
+        return result
+    
+    def infer(self, image_array: np.ndarray, model_used: str) -> Future:
+        """
+        Queue an already preprocessed image for batched inference
+        
+        Args:
+            image_array: Preprocessed image (1, H, W, 3) or (H, W, 3)
+            model_used: "tflite" or "keras"
+        
+        Returns:
+            Future: Resolves to the image's prediction probabilities
+        """
+        self._ensure_started()
+        result = Future()
+        if image_array.ndim == 4:
+            image_array = image_array[0]
+        self._queue.put((image_array, model_used, result))
+        return result
+    
+    def wait(self, future: Future) -> np.ndarray:
+        """
+        Block until a submitted image's predictions are ready
+        
+        Raises:
+            TimeoutError: If no result arrives within the timeout; the
+                request is cancelled if it has not run yet
+        """
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            future.cancel()
+            raise TimeoutError(
+                f"Batched inference timed out after {self.timeout} s"
+            ) from None
+    
+    def _ensure_started(self):
+        """Start the pool and inference thread in the current process"""
+        if self._pid == os.getpid():
+            return
+        
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.queue_size)
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.num_workers,
+                thread_name_prefix="batch-preprocess"
+            )
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(self._queue,),
+                name="batch-inference",
+                daemon=True
+            )
+            self._thread.start()
+            self._pid = os.getpid()
+            logger.info(
+                f"✓ Batch inference service started "
+                f"(max_batch={self.max_batch}, "
+                f"max_delay={self.max_delay * 1000:.1f} ms)"
+            )
+    
+    def _run(self, work_queue: queue.Queue):
+        """Inference loop: collect a batch, run it, repeat"""
+        while True:
+            items = [work_queue.get()]
+            try:
+                deadline = time.monotonic() + self.max_delay
+                
+                while len(items) < self.max_batch:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        items.append(work_queue.get(timeout=timeout))
+                    except queue.Empty:
+                        break
+                
+                # One model call per backend present in the batch
+                by_model = {}
+                for item in items:
+                    by_model.setdefault(item[1], []).append(item)
+                for model_used, group in by_model.items():
+                    self._run_batch(model_used, group)
+            except Exception as e:
+                # Never let the loop die: fail this batch's callers and
+                # keep serving
+                logger.error(f"Batch inference loop error: {e}", exc_info=True)
+                for _, _, future in items:
+                    _fail(future, e)
+    
+    def _run_batch(self, model_used: str,
+                   items: List[Tuple[np.ndarray, str, Future]]):
+        """Run one stacked model call and resolve each caller's Future"""
+        try:
+            batch = np.stack([item[0] for item in items])
+            if model_used == "tflite":
+                predictions = self.model_manager.predict_tflite_batch(batch)
+            else:
+                predictions = self.model_manager.predict_keras_batch(batch)
+        except Exception as e:
+            logger.error(f"Batched inference failed: {e}", exc_info=True)
+            for _, _, future in items:
+                _fail(future, e)
+            return
+        
+        logger.debug(f"Batched inference: {len(items)} images ({model_used})")
+        for row, (_, _, future) in zip(predictions, items):
+            _resolve(future, row)
+
+
+def _resolve(future: Future, row: np.ndarray):
+    """
+    Set a caller's predictions unless the caller has cancelled
+    
+    A caller whose wait() timed out can cancel its future at any moment;
+    losing that race must not fail the rest of the batch.
+    """
+    try:
+        future.set_result(row)
+    except InvalidStateError:
+        pass
+
+
+def _fail(future: Future, error: Exception):
+    """Set error on a caller's future unless it already finished"""
+    try:
+        future.set_exception(error)
+    except InvalidStateError:
+        pass
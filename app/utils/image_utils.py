@@ -5,107 +5,420 @@ Handles image preprocessing and validation
 
 import base64
 import io
+import struct
+import threading
 import numpy as np
+from collections import OrderedDict
+from dataclasses import dataclass
 from PIL import Image
-from typing import Union, Tuple
+from typing import Optional, Union, Tuple
 
 from app.utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Multiplying by the reciprocal lets uint8 -> float32 and scaling fuse
+_INV_255 = np.float32(1.0 / 255.0)
+
+# Optional libjpeg-turbo binding: SIMD JPEG decode straight to a uint8
+# array. Falls back to PIL when the package or shared library is missing.
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _TURBOJPEG = TurboJPEG()
+except (ImportError, OSError, RuntimeError):
+    _TURBOJPEG = None
+
+_JPEG_MAGIC = b'\xff\xd8'
+
+# Content hash for the preprocessing cache: BLAKE3 when installed,
+# otherwise the stdlib's BLAKE2b
+try:
+    from blake3 import blake3 as _content_hash
+except ImportError:
+    from hashlib import blake2b
+    
+    def _content_hash(data):
+        return blake2b(data, digest_size=16)
+
+# Optional Numba: fused bilinear resize + normalize kernel
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+@dataclass
+class DecodedImage:
+    """
+    An upload decoded once and shared by validation, info and preprocessing
+    
+    Attributes:
+        data: Raw encoded image bytes
+        image: PIL image opened on data (only the header parsed, pixels
+            decoded on first use), or None when header was enough
+        header: (format, width, height) read by _quick_validate for
+            JPEG/PNG/WebP, else None
+    """
+    data: bytes
+    image: Optional[Image.Image] = None
+    header: Optional[Tuple[str, int, int]] = None
+
+
+ImageInput = Union[str, bytes, DecodedImage]
+
+DATA_FORMATS = ("channels_last", "channels_first")
+
 
 class ImageProcessor:
     """Image preprocessing and validation"""
     
     def __init__(self, target_size: Tuple[int, int] = (224, 224),
-                 max_size_mb: int = 10):
+                 max_size_mb: int = 10,
+                 resample: int = Image.BILINEAR,
+                 fused_kernel: bool = False,
+                 cache_size: int = 0,
+                 reuse_buffers: bool = False,
+                 data_format: str = "channels_last",
+                 normalize: bool = True):
         """
         Initialize image processor
         
         Args:
             target_size: Target image size (height, width)
             max_size_mb: Maximum allowed image size in MB
+            resample: PIL resampling filter used for resizing; pass
+                Image.LANCZOS on accuracy-sensitive paths
+            fused_kernel: Resize, cast and normalize in one Numba
+                kernel instead of PIL resize + NumPy. Plain bilinear
+                sampling (no antialiasing), so pixels differ slightly
+                from PIL's; ignored when Numba is not installed.
+            cache_size: Number of preprocessed images to keep, keyed by a
+                hash of the encoded bytes (0 disables the cache)
+            reuse_buffers: Write uncached preprocess_image results into a
+                per-thread scratch array instead of a fresh one; each
+                result is only valid until the next call on that thread
+                (greenlet under gevent monkey-patching)
+            data_format: "channels_last" for (H, W, 3) images (TFLite/CPU)
+                or "channels_first" for (3, H, W), matching a model
+                built for NCHW on GPU
+            normalize: Default for the per-call normalize flag: scale
+                pixels to [0, 1]; False keeps raw 0-255 values for models
+                that rescale their input themselves
         """
+        if data_format not in DATA_FORMATS:
+            raise ValueError(f"data_format must be one of {DATA_FORMATS}")
+        
         self.target_size = target_size
+        self.data_format = data_format
+        self.normalize = normalize
         self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.resample = resample
+        self.fused_kernel = fused_kernel and njit is not None
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.reuse_buffers = reuse_buffers
+        self._scratch = threading.local()
+        
+        if fused_kernel and njit is None:
+            logger.warning("Numba not installed; using PIL resize")
+        if self.fused_kernel:
+            _warmup_resize_kernel(self._hwc_view(self.new_batch(1)[0]))
+    
+    @property
+    def image_shape(self) -> Tuple[int, int, int]:
+        """Shape of one preprocessed image in the configured data format"""
+        height, width = self.target_size
+        if self.data_format == "channels_first":
+            return (3, height, width)
+        return (height, width, 3)
+    
+    def new_batch(self, batch_size: int) -> np.ndarray:
+        """Uninitialized float32 batch buffer; fill slots with preprocess_image_into"""
+        return np.empty((batch_size, *self.image_shape), dtype=np.float32)
     
-    def preprocess_image(self, image_data: Union[str, bytes],
-                        normalize: bool = True) -> np.ndarray:
+    def _hwc_view(self, out: np.ndarray) -> np.ndarray:
+        """(H, W, 3) view of an output slot, so pixels land in NCHW directly"""
+        if self.data_format == "channels_first":
+            return out.transpose(1, 2, 0)
+        return out
+    
+    def preprocess_image(self, image_data: ImageInput,
+                        normalize: Optional[bool] = None) -> np.ndarray:
         """
         Preprocess image for model prediction
         
         Args:
-            image_data: Base64 string or bytes
+            image_data: Base64 string, bytes or DecodedImage
             normalize: Whether to normalize pixel values to [0, 1]
+                (default: the processor's normalize setting)
             
         Returns:
-            np.ndarray: Preprocessed image array (1, H, W, 3)
+            np.ndarray: Preprocessed image array (1, H, W, 3), or
+                (1, 3, H, W) for channels_first; read-only
+                when the cache is enabled, since it may be shared, and
+                overwritten by the next call when reuse_buffers is set
+        """
+        if normalize is None:
+            normalize = self.normalize
+        key = None
+        if self.cache_size:
+            try:
+                image_data = self._decoded_bytes(image_data)
+            except ValueError:
+                pass  # malformed base64; preprocess_image_into reports it
+            else:
+                key = self._cache_key(image_data, normalize)
+                with self._cache_lock:
+                    cached = self._cache.get(key)
+                    if cached is not None:
+                        self._cache.move_to_end(key)
+                        return cached
+        
+        if key is None and self.reuse_buffers:
+            img_array = self._scratch_buffer()
+        else:
+            img_array = self.new_batch(1)
+        self.preprocess_image_into(image_data, img_array[0], normalize)
+        
+        if key is not None:
+            img_array.setflags(write=False)
+            with self._cache_lock:
+                self._cache[key] = img_array
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        logger.debug(f"Image preprocessed: shape={img_array.shape}")
+        return img_array
+    
+    def _scratch_buffer(self) -> np.ndarray:
+        """Per-thread single-image float32 batch, allocated on first use"""
+        buf = getattr(self._scratch, 'buf', None)
+        if buf is None:
+            buf = self.new_batch(1)
+            self._scratch.buf = buf
+        return buf
+    
+    def cache_clear(self):
+        """Drop every cached preprocessed image"""
+        with self._cache_lock:
+            self._cache.clear()
+    
+    def _decoded_bytes(self, image_data: ImageInput) -> ImageInput:
+        """Base64-decode strings; bytes and DecodedImage pass through"""
+        if isinstance(image_data, str):
+            return self.decode_image_data(image_data)
+        return image_data
+    
+    @staticmethod
+    def _cache_key(image_data: ImageInput, normalize: bool) -> tuple:
+        """Cache key: content hash of the encoded bytes + normalize flag"""
+        data = image_data.data if isinstance(image_data, DecodedImage) else image_data
+        return _content_hash(data).digest(), normalize
+    
+    @staticmethod
+    def decode_image_data(image_data: Union[str, bytes]) -> bytes:
+        """
+        Decode a base64 string (optionally a data URI) to raw bytes
+        
+        Bytes are returned unchanged. Malformed base64 raises
+        binascii.Error (a ValueError subclass).
         """
+        if not isinstance(image_data, str):
+            return image_data
+        
+        # Remove data URI prefix if present
+        if ',' in image_data:
+            image_data = image_data.split(',', 1)[1]
+        return base64.b64decode(image_data)
+    
+    def decode(self, image_data: ImageInput) -> DecodedImage:
+        """
+        Decode base64 (if needed), check size and parse the image header
+        
+        Call once per upload and pass the result to validate_image,
+        get_image_info and preprocess_image so none of them repeat it.
+        
+        Raises:
+            ValueError: If the data is not a readable image or too large
+        """
+        if isinstance(image_data, DecodedImage):
+            return image_data
+        
         try:
-            # Decode if base64
-            if isinstance(image_data, str):
-                # Remove data URI prefix if present
-                if ',' in image_data:
-                    image_data = image_data.split(',', 1)[1]
-                image_data = base64.b64decode(image_data)
+            image_bytes = self.decode_image_data(image_data)
             
             # Validate size
-            if len(image_data) > self.max_size_bytes:
+            if len(image_bytes) > self.max_size_bytes:
                 raise ValueError(
-                    f"Image size ({len(image_data) / 1024 / 1024:.2f} MB) "
+                    f"Image size ({len(image_bytes) / 1024 / 1024:.2f} MB) "
                     f"exceeds maximum allowed ({self.max_size_bytes / 1024 / 1024} MB)"
                 )
             
-            # Open image
-            img = Image.open(io.BytesIO(image_data))
+            # JPEG/PNG/WebP: struct header check; PIL is only opened
+            # for other formats (or later, if preprocessing needs it)
+            header = _quick_validate(image_bytes)
+            if header is not None:
+                return DecodedImage(image_bytes, header=header)
+            return DecodedImage(image_bytes, Image.open(io.BytesIO(image_bytes)))
             
-            # Convert to RGB if needed
-            if img.mode != 'RGB':
-                logger.debug(f"Converting image from {img.mode} to RGB")
-                img = img.convert('RGB')
-            
-            # Resize
-            img = img.resize(self.target_size, Image.LANCZOS)
-            
-            # Convert to array
-            img_array = np.array(img, dtype=np.float32)
+        except Exception as e:
+            logger.error(f"Image decoding failed: {e}")
+            raise ValueError(f"Failed to process image: {str(e)}")
+    
+    def preprocess_image_into(self, image_data: ImageInput,
+                              out: np.ndarray,
+                              normalize: Optional[bool] = None) -> None:
+        """
+        Preprocess image directly into a caller-provided buffer
+        
+        Args:
+            image_data: Base64 string, bytes or DecodedImage
+            out: Writable float32 array of shape image_shape, e.g. one
+                slot of a new_batch() buffer
+            normalize: Whether to normalize pixel values to [0, 1]
+                (default: the processor's normalize setting)
+        """
+        if normalize is None:
+            normalize = self.normalize
+        
+        # Pixels are produced in (H, W, 3) order; for channels_first the
+        # view's strides scatter them into the planar layout in one pass
+        out = self._hwc_view(out)
+        
+        try:
+            if isinstance(image_data, DecodedImage):
+                image_bytes, img = image_data.data, image_data.image
+            else:
+                # Decode if base64
+                image_bytes, img = self.decode_image_data(image_data), None
             
-            # Normalize
-            if normalize:
-                img_array = img_array / 255.0
+            # Validate size
+            if len(image_bytes) > self.max_size_bytes:
+                raise ValueError(
+                    f"Image size ({len(image_bytes) / 1024 / 1024:.2f} MB) "
+                    f"exceeds maximum allowed ({self.max_size_bytes / 1024 / 1024} MB)"
+                )
             
-            # Add batch dimension
-            img_array = np.expand_dims(img_array, axis=0)
+            # Decode to (H, W, 3) uint8: libjpeg-turbo for JPEGs when
+            # available, PIL for everything else. The fused kernel does
+            # its own resize, so it gets the decoded pixels as they are.
+            resize = not self.fused_kernel
+            pixels = None
+            if _TURBOJPEG is not None and image_bytes[:2] == _JPEG_MAGIC:
+                pixels = self._decode_jpeg_turbo(image_bytes, resize)
+            if pixels is None:
+                if img is None:
+                    img = Image.open(io.BytesIO(image_bytes))
+                pixels = self._decode_pil(img, resize)
             
-            logger.debug(f"Image preprocessed: shape={img_array.shape}")
-            return img_array
+            # Write pixels into the output slot; cast and scale in one pass
+            if self.fused_kernel:
+                _resize_bilinear_kernel(
+                    pixels, out, _INV_255 if normalize else np.float32(1.0)
+                )
+            elif normalize:
+                np.multiply(pixels, _INV_255, out=out)
+            else:
+                out[...] = pixels
             
         except Exception as e:
             logger.error(f"Image preprocessing failed: {e}")
             raise ValueError(f"Failed to process image: {str(e)}")
     
-    def validate_image(self, image_data: Union[str, bytes]) -> bool:
+    def _decode_pil(self, img: Image.Image, resize: bool = True) -> np.ndarray:
+        """Decode (and resize) an opened image, returning (H, W, 3) uint8 pixels"""
+        # Let libjpeg decode straight to RGB at the smallest 1/2..1/8
+        # scale still >= the target size (no-op for other formats)
+        height, width = self.target_size
+        img.draft('RGB', (width, height))
+        
+        # Convert to RGB if needed
+        if img.mode != 'RGB':
+            logger.debug(f"Converting image from {img.mode} to RGB")
+            img = img.convert('RGB')
+        
+        # Resize (PIL takes width, height)
+        if resize:
+            img = img.resize((width, height), self.resample)
+        return np.asarray(img, dtype=np.uint8)
+    
+    def _decode_jpeg_turbo(self, image_data: bytes,
+                           resize: bool = True) -> Optional[np.ndarray]:
+        """
+        Decode a JPEG with libjpeg-turbo, returning (H, W, 3) uint8 pixels
+        
+        Decodes at the largest supported downscale that still covers the
+        target size. Returns None (so PIL is used) for JPEGs turbojpeg
+        cannot handle, e.g. CMYK.
+        
+        Raises:
+            Image.DecompressionBombError: If the header declares more than
+                Image.MAX_IMAGE_PIXELS pixels (PIL's Image.open limit)
+        """
+        height, width = self.target_size
+        try:
+            src_width, src_height, _, _ = _TURBOJPEG.decode_header(image_data)
+        except Exception as e:
+            logger.debug(f"turbojpeg header read failed, using PIL: {e}")
+            return None
+        
+        if (Image.MAX_IMAGE_PIXELS is not None
+                and src_width * src_height > Image.MAX_IMAGE_PIXELS):
+            raise Image.DecompressionBombError(
+                f"Image size ({src_width * src_height} pixels) exceeds limit "
+                f"of {Image.MAX_IMAGE_PIXELS} pixels"
+            )
+        
+        try:
+            scaling_factor = _pick_scaling_factor(
+                src_width, src_height, width, height
+            )
+            pixels = _TURBOJPEG.decode(
+                image_data,
+                pixel_format=TJPF_RGB,
+                scaling_factor=scaling_factor
+            )
+        except Exception as e:
+            logger.debug(f"turbojpeg decode failed, using PIL: {e}")
+            return None
+        
+        if resize and pixels.shape[:2] != (height, width):
+            img = Image.fromarray(pixels).resize((width, height), self.resample)
+            pixels = np.asarray(img, dtype=np.uint8)
+        return pixels
+    
+    def validate_image(self, image_data: ImageInput) -> bool:
         """
         Validate image format and size
         
         Args:
-            image_data: Image data to validate
+            image_data: Image data to validate. A DecodedImage has already
+                been size-checked and header-parsed, so it is accepted
+                without a second parse; corrupt pixel data then surfaces
+                as a ValueError from preprocess_image.
             
         Returns:
             bool: True if valid
         """
+        if isinstance(image_data, DecodedImage):
+            if image_data.header is not None:
+                return True
+            return image_data.image.format is not None
+        
         try:
             # Decode if base64
-            if isinstance(image_data, str):
-                if ',' in image_data:
-                    image_data = image_data.split(',', 1)[1]
-                image_data = base64.b64decode(image_data)
+            image_data = self.decode_image_data(image_data)
             
             # Check size
             if len(image_data) > self.max_size_bytes:
                 return False
             
-            # Try to open
+            # JPEG/PNG/WebP: header check only, no decoder involved
+            if _quick_validate(image_data) is not None:
+                return True
+            
+            # Unknown type: let PIL parse and verify it
             img = Image.open(io.BytesIO(image_data))
             img.verify()
             
@@ -115,7 +428,7 @@ class ImageProcessor:
             logger.error(f"Image validation failed: {e}")
             return False
     
-    def get_image_info(self, image_data: Union[str, bytes]) -> dict:
+    def get_image_info(self, image_data: ImageInput) -> dict:
         """
         Get image information
         
@@ -126,12 +439,12 @@ class ImageProcessor:
             dict: Image information (size, format, dimensions)
         """
         try:
-            if isinstance(image_data, str):
-                if ',' in image_data:
-                    image_data = image_data.split(',', 1)[1]
-                image_data = base64.b64decode(image_data)
-            
-            img = Image.open(io.BytesIO(image_data))
+            if isinstance(image_data, DecodedImage):
+                image_bytes, img = image_data.data, image_data.image
+            else:
+                image_bytes, img = self.decode_image_data(image_data), None
+            if img is None:
+                img = Image.open(io.BytesIO(image_bytes))
             
             return {
                 "format": img.format,
@@ -139,9 +452,153 @@ class ImageProcessor:
                 "size": img.size,
                 "width": img.width,
                 "height": img.height,
-                "size_kb": len(image_data) / 1024
+                "size_kb": len(image_bytes) / 1024
             }
             
         except Exception as e:
             logger.error(f"Failed to get image info: {e}")
-            return {}
\ No newline at end of file
+            return {}
+
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# JPEG start-of-frame markers (SOF0-SOF15 minus DHT, JPG and DAC)
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def _quick_validate(buf: bytes) -> Optional[Tuple[str, int, int]]:
+    """
+    Identify a JPEG, PNG or WebP from its header alone
+    
+    Reads the magic bytes and the frame/IHDR/VP8 header with struct;
+    nothing is decoded. Truncated pixel data is not detected here.
+    
+    Returns:
+        tuple or None: (format, width, height), or None when the type is
+            unknown or the header is malformed
+    """
+    try:
+        if buf[:2] == _JPEG_MAGIC:
+            width, height = _jpeg_size(buf)
+            fmt = "JPEG"
+        elif buf[:8] == _PNG_SIGNATURE and buf[12:16] == b'IHDR':
+            width, height = struct.unpack('>II', buf[16:24])
+            fmt = "PNG"
+        elif buf[:4] == b'RIFF' and buf[8:12] == b'WEBP':
+            width, height = _webp_size(buf)
+            fmt = "WEBP"
+        else:
+            return None
+    except (struct.error, ValueError, IndexError):
+        return None
+    
+    if width <= 0 or height <= 0:
+        return None
+    return fmt, width, height
+
+
+def _jpeg_size(buf: bytes) -> Tuple[int, int]:
+    """Width and height from the first start-of-frame segment"""
+    offset = 2
+    while offset + 4 <= len(buf):
+        if buf[offset] != 0xFF:
+            raise ValueError("Invalid JPEG marker")
+        marker = buf[offset + 1]
+        if marker == 0xFF:
+            # Fill byte before a marker
+            offset += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            # Standalone markers carry no length
+            offset += 2
+            continue
+        
+        segment_length, = struct.unpack('>H', buf[offset + 2:offset + 4])
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack('>HH', buf[offset + 5:offset + 9])
+            return width, height
+        offset += 2 + segment_length
+    raise ValueError("No JPEG frame header")
+
+
+def _webp_size(buf: bytes) -> Tuple[int, int]:
+    """Width and height from a VP8/VP8L/VP8X chunk header"""
+    chunk = buf[12:16]
+    if chunk == b'VP8X':
+        width = int.from_bytes(buf[24:27], 'little') + 1
+        height = int.from_bytes(buf[27:30], 'little') + 1
+    elif chunk == b'VP8L':
+        if buf[20] != 0x2F:
+            raise ValueError("Invalid VP8L signature")
+        bits, = struct.unpack('<I', buf[21:25])
+        width = (bits & 0x3FFF) + 1
+        height = ((bits >> 14) & 0x3FFF) + 1
+    elif chunk == b'VP8 ':
+        if buf[23:26] != b'\x9d\x01\x2a':
+            raise ValueError("Invalid VP8 start code")
+        width, height = struct.unpack('<HH', buf[26:30])
+        width &= 0x3FFF
+        height &= 0x3FFF
+    else:
+        raise ValueError("Unknown WebP chunk")
+    return width, height
+
+
+def _pick_scaling_factor(src_width: int, src_height: int,
+                         width: int, height: int) -> Tuple[int, int]:
+    """Smallest libjpeg-turbo scaling factor whose output covers the target"""
+    best = (1, 1)
+    for num, denom in _TURBOJPEG.scaling_factors:
+        # libjpeg-turbo rounds scaled dimensions up
+        if num >= denom or num * best[1] >= best[0] * denom:
+            continue
+        if (-(-src_width * num // denom) >= width
+                and -(-src_height * num // denom) >= height):
+            best = (num, denom)
+    return best
+
+
+if njit is not None:
+    @njit(fastmath=True, cache=True)
+    def _resize_bilinear_kernel(src, dst, scale):
+        """
+        Bilinear-resize uint8 src (h, w, 3) into float32 dst (H, W, 3)
+        
+        Uses half-pixel centers and multiplies by scale in the same pass.
+        Single-threaded on purpose: batch requests already run it from
+        several decode threads at once, and Numba's default (workqueue)
+        threading layer aborts the process on concurrent parallel calls.
+        """
+        in_h, in_w = src.shape[0], src.shape[1]
+        out_h, out_w = dst.shape[0], dst.shape[1]
+        ratio_y = in_h / out_h
+        ratio_x = in_w / out_w
+        
+        for y in range(out_h):
+            fy = max((y + 0.5) * ratio_y - 0.5, 0.0)
+            y0 = min(int(fy), in_h - 1)
+            y1 = min(y0 + 1, in_h - 1)
+            wy = fy - y0
+            
+            for x in range(out_w):
+                fx = max((x + 0.5) * ratio_x - 0.5, 0.0)
+                x0 = min(int(fx), in_w - 1)
+                x1 = min(x0 + 1, in_w - 1)
+                wx = fx - x0
+                
+                for c in range(3):
+                    top = src[y0, x0, c] * (1.0 - wx) + src[y0, x1, c] * wx
+                    bottom = src[y1, x0, c] * (1.0 - wx) + src[y1, x1, c] * wx
+                    dst[y, x, c] = (top * (1.0 - wy) + bottom * wy) * scale
+else:
+    _resize_bilinear_kernel = None
+
+
+def _warmup_resize_kernel(dst: np.ndarray):
+    """Compile the kernel now so the first request does not pay for JIT"""
+    src = np.zeros(dst.shape, dtype=np.uint8)
+    _resize_bilinear_kernel(src, dst, _INV_255)
+    # np.asarray(PIL image) is read-only, which numba types (and compiles)
+    # separately from a writable array
+    src.setflags(write=False)
+    _resize_bilinear_kernel(src, dst, _INV_255)
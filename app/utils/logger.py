@@ -3,16 +3,152 @@ Logging Configuration
 Centralized logging for the application
 """
 
+import atexit
 import logging
+from functools import lru_cache
+import os
+import queue
 import sys
+import threading
+import time
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+class CachedFormatter(logging.Formatter):
+    """
+    "asctime - name - levelname - message" formatter that reuses work
+    
+    The timestamp is rendered once per second and the " - name - level - "
+    separator once per (logger, level), instead of running strftime and
+    a %-format for every record.
+    """
+    
+    def __init__(self, datefmt: str = "%Y-%m-%d %H:%M:%S"):
+        super().__init__(
+            "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            datefmt=datefmt
+        )
+        self._last_time = (None, None)
+    
+    def formatTime(self, record, datefmt=None):
+        if datefmt is None:
+            # The default format carries milliseconds; nothing to reuse
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        last_second, last_asctime = self._last_time
+        if second != last_second:
+            last_asctime = super().formatTime(record, datefmt)
+            self._last_time = (second, last_asctime)
+        return last_asctime
+    
+    def format(self, record):
+        record.message = record.getMessage()
+        record.asctime = self.formatTime(record, self.datefmt)
+        s = (record.asctime + _record_separator(record.name, record.levelname)
+             + record.message)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            if s[-1:] != "\n":
+                s = s + "\n"
+            s = s + record.exc_text
+        if record.stack_info:
+            if s[-1:] != "\n":
+                s = s + "\n"
+            s = s + self.formatStack(record.stack_info)
+        return s
+
+
+@lru_cache(maxsize=256)
+def _record_separator(name: str, levelname: str) -> str:
+    """Text between the timestamp and the message"""
+    return f" - {name} - {levelname} - "
+
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that batches records into a large write buffer
+    
+    The stream is opened with a 64 KB buffer and is not flushed per
+    record, so many lines go out in one write() syscall. Records at
+    flush_level or above are flushed immediately; everything else is
+    flushed by a background thread at most flush_interval seconds later
+    (and on close). The file size used for rollover is tracked in memory
+    instead of asking the stream, which would force a flush.
+    """
+    
+    def __init__(self, filename, buffer_size: int = 64 * 1024,
+                 flush_interval: float = 1.0,
+                 flush_level: int = logging.WARNING,
+                 **kwargs):
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self._size = 0
+        self._flusher_pid = None
+        self._stopped = False
+        super().__init__(filename, **kwargs)
+    
+    def _open(self):
+        stream = open(self.baseFilename, self.mode, buffering=self.buffer_size,
+                      encoding=self.encoding, errors=self.errors)
+        self._size = os.fstat(stream.fileno()).st_size
+        return stream
+    
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            # Size is approximate (characters, not bytes), as in the base
+            # class; never roll over anything but a regular file
+            if (self.maxBytes > 0 and self._size
+                    and self._size + len(msg) >= self.maxBytes
+                    and os.path.isfile(self.baseFilename)):
+                self.doRollover()
+                if self.stream is None:
+                    self.stream = self._open()
+            self.stream.write(msg)
+            self._size += len(msg)
+            if record.levelno >= self.flush_level:
+                self.stream.flush()
+            else:
+                self._ensure_flusher()
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+    
+    def close(self):
+        self._stopped = True
+        super().close()
+    
+    def _ensure_flusher(self):
+        """Start the periodic flush thread in the current process"""
+        if self._flusher_pid != os.getpid():
+            self._flusher_pid = os.getpid()
+            threading.Thread(target=self._flush_periodically,
+                             name="log-flush", daemon=True).start()
+    
+    def _flush_periodically(self):
+        while not self._stopped:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+# Queue handlers installed by setup_logger; each owns a background listener
+_queue_handlers = []
 
 
 def setup_logger(name, log_file=None, level=logging.INFO):
     """
     Setup logger with file and console handlers
     
+    The logger itself only gets a QueueHandler, so a log call is a
+    queue.put; a background QueueListener thread hands the records to the
+    console and file handlers, which do the I/O.
+    
     Args:
         name: Logger name
         log_file: Path to log file
@@ -31,34 +167,79 @@ def setup_logger(name, log_file=None, level=logging.INFO):
         return logger
     
     # Format
-    formatter = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S"
-    )
+    formatter = CachedFormatter(datefmt="%Y-%m-%d %H:%M:%S")
     
     # Console handler
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setLevel(level)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
     
     # File handler (if log_file provided)
     if log_file:
         log_path = Path(log_file)
         log_path.parent.mkdir(parents=True, exist_ok=True)
         
-        file_handler = RotatingFileHandler(
+        file_handler = BufferedRotatingFileHandler(
             log_file,
             maxBytes=10 * 1024 * 1024,  # 10MB
             backupCount=5
         )
         file_handler.setLevel(level)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    queue_handler = QueueHandler(queue.SimpleQueue())
+    queue_handler.handlers = handlers
+    _start_listener(queue_handler)
+    logger.addHandler(queue_handler)
+    _queue_handlers.append(queue_handler)
     
     return logger
 
 
+def _start_listener(queue_handler):
+    """Start a listener thread draining queue_handler into its handlers"""
+    listener = QueueListener(
+        queue_handler.queue,
+        *queue_handler.handlers,
+        respect_handler_level=True
+    )
+    listener.start()
+    queue_handler.listener = listener
+
+
+@atexit.register
+def _stop_listeners():
+    """Flush queued records before the interpreter exits"""
+    for queue_handler in _queue_handlers:
+        queue_handler.listener.stop()
+
+
+def _flush_handlers():
+    """Write out buffered records so a forked child does not inherit them"""
+    for queue_handler in _queue_handlers:
+        for handler in queue_handler.handlers:
+            handler.flush()
+
+
+def _restart_listeners():
+    """
+    Give a forked child its own queues and listener threads
+    
+    Threads do not survive fork(), so records logged in a gunicorn worker
+    forked from a preloaded master would otherwise never be written.
+    """
+    for queue_handler in _queue_handlers:
+        queue_handler.queue = queue.SimpleQueue()
+        _start_listener(queue_handler)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(before=_flush_handlers,
+                        after_in_child=_restart_listeners)
+
+
 def get_logger(name):
     """Get or create logger"""
     return logging.getLogger(name)
\ No newline at end of file
@@ -0,0 +1,24 @@
+"""
+Time Utilities
+Cheap timestamps for response payloads
+"""
+
+import time
+from datetime import datetime
+from functools import lru_cache
+
+
+@lru_cache(maxsize=1)
+def _format_second(epoch_second: int) -> str:
+    """Format an epoch second as ISO 8601 (cached for the current second)"""
+    return datetime.fromtimestamp(epoch_second).isoformat()
+
+
+def iso_now() -> str:
+    """
+    Current time as ISO 8601 at one-second resolution
+    
+    The string is formatted once per second and reused, so calling this
+    per prediction costs a clock read and a cache hit.
+    """
+    return _format_second(int(time.time()))
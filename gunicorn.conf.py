@@ -0,0 +1,63 @@
+"""
+Gunicorn Configuration
+Production server settings, picked up automatically from the project root
+
+For raw-throughput benchmarks, Meinheld can replace gevent:
+    gunicorn -k meinheld.gmeinheld.MeinheldWorker wsgi:app
+"""
+
+import os
+
+# Server socket
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+
+# Workers: gevent lets one process overlap many requests that are waiting
+# on the network or on TensorFlow calls that release the GIL
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * (os.cpu_count() or 1) + 1))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gevent")
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+
+# Split the cores between workers so workers x threads ~= cores; otherwise
+# every worker's TensorFlow/TFLite pools default to all cores and the
+# processes oversubscribe the CPU
+_threads_per_worker = str(max(1, (os.cpu_count() or 1) // workers))
+for _var in ("INTRA_OP_THREADS", "INTER_OP_THREADS", "TFLITE_NUM_THREADS"):
+    os.environ.setdefault(_var, _threads_per_worker)
+
+# Load the app (and its models) once in the master so workers share the
+# weights through copy-on-write pages. Only safe for TFLite-only serving:
+# Keras warm-up starts the TensorFlow runtime, which is not fork-safe once
+# initialized. With gevent the master must also be monkey-patched before
+# the app is imported (GEVENT_MONKEY_PATCH=True), so preloading defaults
+# on only when both hold.
+_tflite_only = os.getenv("SERVE_TFLITE_ONLY", "False").lower() == "true"
+_patched = (
+    worker_class != "gevent"
+    or os.getenv("GEVENT_MONKEY_PATCH", "False").lower() == "true"
+)
+preload_app = os.getenv(
+    "GUNICORN_PRELOAD", str(_tflite_only and _patched)
+).lower() == "true"
+
+# Workers only see the GPU memory they actually use
+os.environ.setdefault("TF_FORCE_GPU_ALLOW_GROWTH", "true")
+
+# Connections
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 5))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+
+
+def post_fork(server, worker):
+    """Give each preloaded worker its own TFLite interpreter"""
+    if not preload_app:
+        return
+    
+    # The entry point module (wsgi:app) was imported by the master
+    from wsgi import app as flask_app
+    if flask_app.model_manager.keras_model is not None:
+        raise RuntimeError(
+            "GUNICORN_PRELOAD=True with a Keras model loaded: TensorFlow "
+            "was initialized before fork. Set SERVE_TFLITE_ONLY=True or "
+            "GUNICORN_PRELOAD=False"
+        )
+    flask_app.model_manager.reload_tflite_interpreter()
@@ -0,0 +1,173 @@
+"""
+Model Export Script
+Converts the trained Keras model to an INT8-quantized TFLite model
+"""
+
+import random
+from itertools import chain, zip_longest
+from pathlib import Path
+
+import tensorflow as tf
+
+# Add parent directory to path
+import sys
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import get_config
+from app.core.model import load_model_metadata
+from app.data.loader import load_manifest, manifest_path
+from app.utils.image_utils import ImageProcessor
+from app.utils.logger import setup_logger, get_logger
+
+# Setup logging
+setup_logger("export", log_file="logs/export.log")
+logger = get_logger(__name__)
+
+# Load config
+config = get_config()
+
+
+class ModelExporter:
+    """Handles INT8 post-training quantization"""
+    
+    def __init__(self, model_path: Path, sample_dir: Path,
+                 num_samples: int = 100,
+                 seed: int = 42,
+                 sample_files: list = None,
+                 normalize: bool = None):
+        """
+        Initialize exporter
+        
+        Args:
+            model_path: Path to trained Keras model (.h5)
+            sample_dir: Directory with class subfolders used for calibration
+            num_samples: Number of calibration images
+            seed: Random seed for sample selection
+            sample_files: Calibration image paths to pick from instead of
+                scanning sample_dir (e.g. from a split manifest)
+            normalize: Scale calibration pixels to [0, 1] (default: the
+                model's metadata, else NORMALIZE_INPUT)
+        """
+        self.model_path = Path(model_path)
+        self.sample_dir = Path(sample_dir)
+        self.num_samples = num_samples
+        self.seed = seed
+        self.sample_files = sample_files
+        
+        # Calibration images go through the same preprocessing as serving
+        if normalize is None:
+            normalize = load_model_metadata(config.MODEL_METADATA_PATH).get(
+                "normalize_input", config.NORMALIZE_INPUT
+            )
+        self.image_processor = ImageProcessor(
+            target_size=config.IMG_SIZE,
+            normalize=normalize
+        )
+    
+    def get_sample_images(self) -> list:
+        """Pick calibration images spread across all classes"""
+        if self.sample_files is not None:
+            images = [Path(f) for f in self.sample_files]
+        else:
+            if not self.sample_dir.exists():
+                raise FileNotFoundError(f"Sample directory not found: {self.sample_dir}")
+            
+            image_extensions = {'.jpg', '.jpeg', '.png'}
+            images = [
+                f for f in self.sample_dir.rglob('*')
+                if f.suffix.lower() in image_extensions
+            ]
+        
+        if not images:
+            raise ValueError(f"No calibration images found in {self.sample_dir}")
+        
+        # Shuffle within each class (its parent directory), then take one
+        # image per class in turn so every class is represented
+        by_class = {}
+        for image in images:
+            by_class.setdefault(image.parent.name, []).append(image)
+        rng = random.Random(self.seed)
+        groups = [by_class[name] for name in sorted(by_class)]
+        for group in groups:
+            rng.shuffle(group)
+        
+        interleaved = chain.from_iterable(zip_longest(*groups))
+        return [image for image in interleaved if image is not None][:self.num_samples]
+    
+    def representative_dataset(self):
+        """Yield preprocessed calibration samples for the converter"""
+        for image_path in self.get_sample_images():
+            image_array = self.image_processor.preprocess_image(
+                image_path.read_bytes()
+            )
+            yield [image_array]
+    
+    def export(self, output_path: Path) -> int:
+        """
+        Convert and save the INT8 TFLite model
+        
+        Returns:
+            int: Size of the exported model in bytes
+        """
+        logger.info(f"Loading Keras model from {self.model_path}")
+        model = tf.keras.models.load_model(str(self.model_path))
+        
+        converter = tf.lite.TFLiteConverter.from_keras_model(model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = self.representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.int8
+        # Keep the softmax output in float32: int8 probabilities would lose
+        # precision, and the server reads float output without dequantizing
+        converter.inference_output_type = tf.float32
+        
+        logger.info("Quantizing model to INT8...")
+        tflite_model = converter.convert()
+        
+        output_path = Path(output_path)
+        output_path.write_bytes(tflite_model)
+        
+        size_kb = len(tflite_model) / 1024
+        logger.info(f"✓ INT8 TFLite model saved: {output_path} ({size_kb:.2f} KB)")
+        return len(tflite_model)
+
+
+def main():
+    """Main execution"""
+    print("="*70)
+    print("AGRICULTURAL CROP DISEASE DETECTION")
+    print("MODEL EXPORT (INT8 TFLITE)")
+    print("="*70 + "\n")
+    
+    if not config.MODEL_PATH.exists():
+        logger.error(f"Keras model not found: {config.MODEL_PATH}")
+        print("\n❌ Trained model not found!")
+        print("Please run 'python scripts/train_model.py' first!")
+        return
+    
+    try:
+        # Calibrate on the validation split, listed by its manifest unless
+        # prepare_data.py materialized it
+        val_manifest = manifest_path(config.PROCESSED_DATA_DIR, 'validation')
+        sample_files = None
+        if val_manifest.exists():
+            sample_files = load_manifest(val_manifest).paths
+        
+        exporter = ModelExporter(
+            model_path=config.MODEL_PATH,
+            sample_dir=config.VAL_DIR,
+            sample_files=sample_files
+        )
+        exporter.export(config.TFLITE_MODEL_PATH)
+        
+        print("\n✅ Export successful!")
+        print("Set SERVE_TFLITE_ONLY=True to serve without the Keras model")
+    
+    except Exception as e:
+        logger.error(f"Model export failed: {e}", exc_info=True)
+        print(f"\n❌ Model export failed: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,19 +3,24 @@ Data Preparation Script
 Organizes raw dataset into train/validation/test splits
 """
 
+import argparse
+import asyncio
 import os
 import shutil
-import random
-import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple
+
+import numpy as np
+import orjson
 
 # Add parent directory to path
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.config import get_config
+from app.data.loader import SPLITS, Manifest, manifest_path, write_manifest
 from app.utils.logger import setup_logger, get_logger
+from scripts._copy_async import copy_all
 
 # Setup logging
 setup_logger("data_prep", log_file="logs/data_prep.log")
@@ -24,6 +29,93 @@ logger = get_logger(__name__)
 # Load config
 config = get_config()
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Lowercased image file suffixes, matched with one str.endswith call
+_EXTS = ('.jpg', '.jpeg', '.png')
+
+# ioctl request number for a copy-on-write clone (btrfs, XFS reflink)
+_FICLONE = 0x40049409
+
+
+def _fast_copy(src, dst):
+    """
+    Copy a file, letting the kernel do the work where possible
+    
+    Tries a reflink clone (FICLONE, no data moved), then an in-kernel
+    os.copy_file_range, then os.sendfile (which still works where
+    copy_file_range is refused, e.g. across filesystems on older
+    kernels), and finally shutil.copy2. The source mtime is preserved
+    either way.
+    """
+    try:
+        src_fd = _open_source(src)
+        try:
+            dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                st = os.fstat(src_fd)
+                _kernel_copy(src_fd, dst_fd, st.st_size)
+            finally:
+                os.close(dst_fd)
+        finally:
+            os.close(src_fd)
+        os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns))
+    except (OSError, AttributeError):
+        # Unsupported FS or platform
+        shutil.copy2(src, dst)
+
+
+def _open_source(src) -> int:
+    """Open src read-only without updating its atime where allowed"""
+    noatime = getattr(os, 'O_NOATIME', 0)
+    try:
+        return os.open(src, os.O_RDONLY | noatime)
+    except PermissionError:
+        if not noatime:
+            raise
+        # O_NOATIME is only allowed for the file's owner
+        return os.open(src, os.O_RDONLY)
+
+
+def _kernel_copy(src_fd: int, dst_fd: int, size: int):
+    """Clone, copy_file_range or sendfile size bytes from src_fd to dst_fd"""
+    try:
+        if fcntl is None:
+            raise OSError("FICLONE not available")
+        fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+        return
+    except OSError:
+        pass
+    
+    offset = 0
+    try:
+        while offset < size:
+            copied = os.copy_file_range(src_fd, dst_fd, size - offset,
+                                        offset, offset)
+            if copied == 0:
+                # Some filesystems (and FUSE mounts) report 0 instead of
+                # failing; fall through rather than leave a short copy
+                break
+            offset += copied
+        if offset == size:
+            return
+    except (OSError, AttributeError):
+        pass
+    
+    # Carry on from wherever copy_file_range stopped
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    while offset < size:
+        sent = os.sendfile(dst_fd, src_fd, offset, size - offset)
+        if sent == 0:
+            break
+        offset += sent
+    if offset != size:
+        # _fast_copy falls back to shutil.copy2
+        raise OSError(f"Short copy: {offset} of {size} bytes")
+
 
 class DataPreparation:
     """Handles dataset preparation"""
@@ -32,7 +124,9 @@ class DataPreparation:
                  train_ratio: float = 0.7,
                  val_ratio: float = 0.15,
                  test_ratio: float = 0.15,
-                 seed: int = 42):
+                 seed: int = 42,
+                 jobs: int = None,
+                 materialize: bool = False):
         """
         Initialize data preparation
         
@@ -43,6 +137,9 @@ class DataPreparation:
             val_ratio: Validation set ratio
             test_ratio: Test set ratio
             seed: Random seed for reproducibility
+            jobs: Number of parallel file copies (default: CPU count x 4)
+            materialize: Copy images into train/validation/test class
+                directories instead of writing split manifests
         """
         self.source_dir = Path(source_dir)
         self.output_dir = Path(output_dir)
@@ -50,9 +147,11 @@ class DataPreparation:
         self.val_ratio = val_ratio
         self.test_ratio = test_ratio
         self.seed = seed
+        self.jobs = jobs or (os.cpu_count() or 1) * 4
+        self.materialize = materialize
         
-        # Set random seed
-        random.seed(seed)
+        # Seeded generator for the per-class shuffles
+        self._rng = np.random.default_rng(seed)
         
         # Validate ratios
         if abs(train_ratio + val_ratio + test_ratio - 1.0) > 0.001:
@@ -76,11 +175,14 @@ class DataPreparation:
         if not self.source_dir.exists():
             raise FileNotFoundError(f"Source directory not found: {self.source_dir}")
         
-        # Get all directories (exclude hidden and PlantVillage root)
-        class_dirs = [
-            d for d in self.source_dir.iterdir()
-            if d.is_dir() and not d.name.startswith('.') and d.name != 'PlantVillage'
-        ]
+        # Get all directories (exclude hidden and PlantVillage root);
+        # DirEntry answers is_dir() from the readdir data without a stat
+        with os.scandir(self.source_dir) as it:
+            class_dirs = [
+                Path(e.path) for e in it
+                if e.is_dir(follow_symlinks=False)
+                and not e.name.startswith('.') and e.name != 'PlantVillage'
+            ]
         
         if not class_dirs:
             raise ValueError(f"No class directories found in {self.source_dir}")
@@ -88,65 +190,72 @@ class DataPreparation:
         logger.info(f"Found {len(class_dirs)} disease classes")
         return sorted(class_dirs, key=lambda x: x.name)
     
-    def split_and_copy_images(self, class_dir: Path, class_name: str) -> Tuple[int, int, int]:
+    def split_images(self, class_dir: Path) -> tuple:
         """
-        Split and copy images for a class
+        Shuffle a class's images and split them
         
         Returns:
-            tuple: (train_count, val_count, test_count)
+            tuple: (train, validation, test) arrays of os.DirEntry
         """
         # Get all images
-        image_extensions = {'.jpg', '.jpeg', '.png', '.JPG', '.JPEG', '.PNG'}
-        images = [
-            f for f in class_dir.iterdir()
-            if f.suffix in image_extensions
-        ]
+        with os.scandir(class_dir) as it:
+            entries = [
+                e for e in it
+                if e.name.lower().endswith(_EXTS) and e.is_file()
+            ]
         
-        if not images:
+        if not entries:
             logger.warning(f"No images found in {class_dir}")
-            return 0, 0, 0
+            empty = np.empty(0, dtype=object)
+            return empty, empty, empty
         
-        # Shuffle
-        random.shuffle(images)
+        images = np.empty(len(entries), dtype=object)
+        images[:] = entries
         
         # Calculate split indices
         n_total = len(images)
         n_train = int(n_total * self.train_ratio)
         n_val = int(n_total * self.val_ratio)
         
-        # Split
-        train_images = images[:n_train]
-        val_images = images[n_train:n_train + n_val]
-        test_images = images[n_train + n_val:]
-        
-        # Create class directories in splits
-        for split in ['train', 'validation', 'test']:
+        # Shuffle and split
+        perm = self._rng.permutation(n_total)
+        train_idx, val_idx, test_idx = np.split(perm, [n_train, n_train + n_val])
+        return images[train_idx], images[val_idx], images[test_idx]
+    
+    def _copy_pairs(self, splits: tuple, class_name: str) -> list:
+        """Create a class's split directories and list its (src, dst) copies"""
+        for split in SPLITS:
             (self.output_dir / split / class_name).mkdir(parents=True, exist_ok=True)
         
-        # Copy images
-        for img in train_images:
-            shutil.copy2(img, self.output_dir / 'train' / class_name / img.name)
-        
-        for img in val_images:
-            shutil.copy2(img, self.output_dir / 'validation' / class_name / img.name)
-        
-        for img in test_images:
-            shutil.copy2(img, self.output_dir / 'test' / class_name / img.name)
-        
-        return len(train_images), len(val_images), len(test_images)
+        return [
+            (img, self.output_dir / split / class_name / img.name)
+            for split, split_images in zip(SPLITS, splits)
+            for img in split_images
+        ]
     
     def prepare(self):
-        """Main preparation method"""
+        """Split every class, copy or list the images, then save statistics"""
         logger.info("="*70)
         logger.info("STARTING DATA PREPARATION")
+        if self.materialize:
+            logger.info(f"Copying images ({self.jobs} parallel copies)")
+        else:
+            logger.info("Writing split manifests (no images copied)")
         logger.info("="*70)
         
         # Create structure
-        self.create_directory_structure()
+        if self.materialize:
+            self.create_directory_structure()
+        else:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
         
         # Get classes
         class_dirs = self.get_class_directories()
         
+        # Manifest columns per split: absolute image paths and class indices
+        listings = {split: ([], []) for split in SPLITS}
+        copy_pairs = []
+        
         # Process each class
         stats = {
             'train': 0,
@@ -156,15 +265,21 @@ class DataPreparation:
         
         class_names = []
         
-        for class_dir in class_dirs:
+        for label, class_dir in enumerate(class_dirs):
             class_name = class_dir.name
             class_names.append(class_name)
             
             logger.info(f"\nProcessing: {class_name}")
             
-            train_count, val_count, test_count = self.split_and_copy_images(
-                class_dir, class_name
-            )
+            splits = self.split_images(class_dir)
+            if self.materialize:
+                copy_pairs.extend(self._copy_pairs(splits, class_name))
+            else:
+                for split, images in zip(SPLITS, splits):
+                    paths, labels = listings[split]
+                    paths.extend(os.path.abspath(e.path) for e in images)
+                    labels.extend([label] * len(images))
+            train_count, val_count, test_count = (len(images) for images in splits)
             
             logger.info(
                 f"  Total: {train_count + val_count + test_count} | "
@@ -175,6 +290,25 @@ class DataPreparation:
             stats['validation'] += val_count
             stats['test'] += test_count
         
+        # Copy every class in one pass: inode order across the whole
+        # dataset, up to 64 copies in flight
+        if copy_pairs:
+            logger.info(f"\nCopying {len(copy_pairs)} images...")
+            # Copies are I/O-bound: many in flight keep the disk queue busy
+            with ThreadPoolExecutor(max_workers=self.jobs,
+                                    thread_name_prefix="copy") as pool:
+                asyncio.run(copy_all(copy_pairs, _fast_copy, pool))
+            logger.info("✓ Images copied")
+        
+        # Write manifests; drop stale ones so training reads the copies
+        for split, (paths, labels) in listings.items():
+            path = manifest_path(self.output_dir, split)
+            if self.materialize:
+                path.unlink(missing_ok=True)
+            else:
+                write_manifest(path, Manifest(class_names, paths, labels))
+                logger.info(f"✓ Manifest saved: {path}")
+        
         # Save statistics
         dataset_stats = {
             'num_classes': len(class_names),
@@ -185,12 +319,12 @@ class DataPreparation:
                 'validation': self.val_ratio,
                 'test': self.test_ratio
             },
-            'seed': self.seed
+            'seed': self.seed,
+            'materialized': self.materialize
         }
         
         stats_file = self.output_dir.parent / 'dataset_stats.json'
-        with open(stats_file, 'w') as f:
-            json.dump(dataset_stats, f, indent=2)
+        stats_file.write_bytes(orjson.dumps(dataset_stats, option=orjson.OPT_INDENT_2))
         
         logger.info("\n" + "="*70)
         logger.info("DATA PREPARATION COMPLETE!")
@@ -208,6 +342,14 @@ class DataPreparation:
 
 def main():
     """Main execution"""
+    parser = argparse.ArgumentParser(description="Split the raw dataset into train/validation/test")
+    parser.add_argument("--jobs", type=int, default=config.PREP_JOBS,
+                        help="Number of parallel file copies (default: PREP_JOBS)")
+    parser.add_argument("--materialize", action="store_true",
+                        help="Copy images into split directories instead of "
+                             "writing train/validation/test manifests")
+    args = parser.parse_args()
+    
     print("="*70)
     print("AGRICULTURAL CROP DISEASE DETECTION")
     print("DATA PREPARATION SCRIPT")
@@ -239,11 +381,16 @@ def main():
             output_dir=config.PROCESSED_DATA_DIR,
             train_ratio=config.TRAIN_RATIO,
             val_ratio=config.VAL_RATIO,
-            test_ratio=config.TEST_RATIO
+            test_ratio=config.TEST_RATIO,
+            jobs=args.jobs,
+            materialize=args.materialize
         )
         
         stats = prep.prepare()
         
+        # The training cache holds the previous split's decoded images
+        shutil.rmtree(config.TF_CACHE_DIR, ignore_errors=True)
+        
         print("\n✅ Data preparation successful!")
         print(f"Next step: Run 'python scripts/train_model.py' to train the model")
         
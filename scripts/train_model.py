@@ -4,20 +4,24 @@ Trains the crop disease detection model
 """
 
 import os
-import json
+import csv
+import queue
+import threading
 from pathlib import Path
+import orjson
 import tensorflow as tf
 from tensorflow import keras
 from tensorflow.keras import layers
-from tensorflow.keras.applications import MobileNetV2
-from tensorflow.keras.preprocessing.image import ImageDataGenerator
 
 # Add parent directory to path
 import sys
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.config import get_config
+from app.core.model import save_model_metadata
+from app.data.loader import load_manifest, manifest_path
 from app.utils.logger import setup_logger, get_logger
+from scripts.export_model import ModelExporter
 
 # Setup logging
 setup_logger("training", log_file="logs/training.log")
@@ -26,6 +30,80 @@ logger = get_logger(__name__)
 # Load config
 config = get_config()
 
+# Model input: (height, width, RGB)
+_INPUT_SHAPE = (*config.IMG_SIZE, 3)
+
+
+class AsyncCSVLogger(keras.callbacks.CSVLogger):
+    """
+    CSVLogger that writes rows on a background thread
+    
+    on_epoch_end only converts the logs to plain values and queues them;
+    a writer thread owns the (64 KB buffered) file and does the writes,
+    flushing whenever it has caught up, so slow storage never stalls the
+    training loop. Rows are drained and the file closed in on_train_end.
+    If the writer thread dies, later rows are dropped with a warning
+    instead of blocking training.
+    """
+    
+    def __init__(self, filename, separator=",", append=False,
+                 max_pending: int = 64):
+        super().__init__(filename, separator=separator, append=append)
+        self.max_pending = max_pending
+        self._queue = None
+        self._thread = None
+    
+    def on_train_begin(self, logs=None):
+        write_header = not (
+            self.append and os.path.exists(self.filename)
+            and os.path.getsize(self.filename) > 0
+        )
+        self._queue = queue.Queue(maxsize=self.max_pending)
+        self._thread = threading.Thread(
+            target=self._write_rows,
+            args=(self._queue, "a" if self.append else "w", write_header),
+            name="csv-logger",
+            daemon=True
+        )
+        self._thread.start()
+    
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        row = {"epoch": epoch}
+        for key in sorted(logs):
+            value = logs[key]
+            row[key] = value if isinstance(value, str) else float(value)
+        self._put(row)
+    
+    def on_train_end(self, logs=None):
+        self._put(None)
+        self._thread.join()
+    
+    def _put(self, row):
+        """Queue a row, giving up if the writer thread has died"""
+        while self._thread.is_alive():
+            try:
+                self._queue.put(row, timeout=1.0)
+                return
+            except queue.Full:
+                continue
+        logger.warning(f"CSV writer thread stopped; {self.filename} not updated")
+    
+    def _write_rows(self, rows: queue.Queue, mode: str, write_header: bool):
+        with open(self.filename, mode, newline="", buffering=1 << 16) as f:
+            writer = None
+            while (row := rows.get()) is not None:
+                if writer is None:
+                    writer = csv.DictWriter(f, fieldnames=list(row),
+                                            delimiter=self.sep,
+                                            restval="NA",
+                                            extrasaction="ignore")
+                    if write_header:
+                        writer.writeheader()
+                writer.writerow(row)
+                if rows.empty():
+                    f.flush()
+
 
 class ModelTrainer:
     """Handles model training"""
@@ -40,36 +118,28 @@ class ModelTrainer:
         self.num_classes = num_classes
         self.model = None
         self.history = None
+        self.mixed_precision = False
+        self.val_files = []
         
         logger.info(f"Trainer initialized for {num_classes} classes")
     
     def build_model(self):
-        """Build transfer learning model"""
-        logger.info("Building model architecture...")
+        """
+        Build transfer learning model
         
-        # Base model
-        base_model = MobileNetV2(
-            input_shape=(*config.IMG_SIZE, 3),
-            include_top=False,
-            weights='imagenet'
-        )
+        With a GPU present (and MIXED_PRECISION enabled) layers compute in
+        float16 on the tensor cores while keeping float32 weights; the
+        classifier output stays float32 for a stable softmax and loss.
+        Keras wraps the optimizer in a LossScaleOptimizer at compile time.
+        """
+        logger.info("Building model architecture...")
         
-        # Freeze base
-        base_model.trainable = False
+        if config.MIXED_PRECISION and tf.config.list_physical_devices('GPU'):
+            keras.mixed_precision.set_global_policy('mixed_float16')
+            self.mixed_precision = True
+            logger.info("✓ Mixed precision enabled (mixed_float16)")
         
-        # Build model
-        self.model = keras.Sequential([
-            base_model,
-            layers.GlobalAveragePooling2D(),
-            layers.BatchNormalization(),
-            layers.Dropout(0.3),
-            layers.Dense(512, activation='relu'),
-            layers.BatchNormalization(),
-            layers.Dropout(0.4),
-            layers.Dense(256, activation='relu'),
-            layers.Dropout(0.3),
-            layers.Dense(self.num_classes, activation='softmax')
-        ])
+        self.model = self._build_network()
         
         # Compile
         self.model.compile(
@@ -81,54 +151,156 @@ class ModelTrainer:
                     k=min(3, self.num_classes),
                     name='top_3_accuracy'
                 )
-            ]
+            ],
+            jit_compile=config.XLA_JIT
         )
         
         logger.info("✓ Model built successfully")
         return self.model
     
-    def create_data_generators(self):
-        """Create data generators with augmentation"""
-        logger.info("Creating data generators...")
+    def _build_network(self):
+        """Build the (uncompiled) network under the current dtype policy"""
+        # Imported here: only this application is needed, not the whole
+        # keras.applications registry at script start
+        from tensorflow.keras.applications import MobileNetV2
         
-        # Training augmentation
-        train_datagen = ImageDataGenerator(
-            rescale=1./255,
-            rotation_range=30,
-            width_shift_range=0.2,
-            height_shift_range=0.2,
-            shear_range=0.2,
-            zoom_range=0.2,
-            horizontal_flip=True,
-            vertical_flip=True,
-            fill_mode='nearest',
-            brightness_range=[0.8, 1.2]
+        # Base model
+        base_model = MobileNetV2(
+            input_shape=_INPUT_SHAPE,
+            include_top=False,
+            weights='imagenet'
         )
         
-        # Validation (no augmentation)
-        val_datagen = ImageDataGenerator(rescale=1./255)
-        
-        # Generators
-        train_gen = train_datagen.flow_from_directory(
-            config.TRAIN_DIR,
-            target_size=config.IMG_SIZE,
-            batch_size=config.BATCH_SIZE,
-            class_mode='categorical',
-            shuffle=True
-        )
+        # Freeze base: no trainable variables, so the gradient tape and
+        # optimizer only see the classifier head
+        base_model.trainable = False
         
-        val_gen = val_datagen.flow_from_directory(
-            config.VAL_DIR,
-            target_size=config.IMG_SIZE,
-            batch_size=config.BATCH_SIZE,
-            class_mode='categorical',
-            shuffle=False
+        # Build model; the model maps raw 0-255 pixels to MobileNetV2's
+        # [-1, 1] range itself, so the input pipeline never rescales.
+        # The base always runs in inference mode (training=False): its
+        # batch-norm statistics stay fixed, also once fine-tuning unfreezes
+        # its top layers.
+        inputs = keras.Input(shape=_INPUT_SHAPE)
+        x = layers.Rescaling(1./127.5, offset=-1)(inputs)
+        x = base_model(x, training=False)
+        x = layers.GlobalAveragePooling2D()(x)
+        x = layers.BatchNormalization()(x)
+        x = layers.Dropout(0.3)(x)
+        x = layers.Dense(512, activation='relu')(x)
+        x = layers.BatchNormalization()(x)
+        x = layers.Dropout(0.4)(x)
+        x = layers.Dense(256, activation='relu')(x)
+        x = layers.Dropout(0.3)(x)
+        x = layers.Dense(self.num_classes, dtype='float32')(x)
+        outputs = layers.Activation('softmax', dtype='float32')(x)
+        return keras.Model(inputs, outputs, name='crop_disease_classifier')
+    
+    def _base_model(self):
+        """The MobileNetV2 backbone inside self.model"""
+        return next(
+            layer for layer in self.model.layers
+            if isinstance(layer, keras.Model)
         )
+    
+    def create_data_generators(self):
+        """
+        Create tf.data input pipelines with augmentation
+        
+        Images listed in the split manifests (or the split directories)
+        are decoded, resized and cached on disk as uint8 under
+        TF_CACHE_DIR, so only the first epoch decodes JPEGs; later epochs
+        stream the cache file. Shuffling and augmentation happen after
+        the cache so they vary per epoch; augmentation runs as Keras
+        preprocessing layers mapped over the batches in parallel, and
+        prefetching overlaps the input pipeline with the training step.
+        Pixels stay in 0-255; rescaling is the model's first layer.
+        
+        Delete TF_CACHE_DIR if the processed images or IMG_SIZE change
+        (prepare_data.py does this).
+        """
+        logger.info("Creating data pipelines...")
         
-        logger.info(f"✓ Train samples: {train_gen.samples}")
-        logger.info(f"✓ Validation samples: {val_gen.samples}")
+        # Training augmentation
+        augment = keras.Sequential([
+            layers.RandomFlip('horizontal_and_vertical'),
+            layers.RandomRotation(30 / 360, fill_mode='nearest'),
+            layers.RandomZoom(0.2, fill_mode='nearest'),
+            layers.RandomTranslation(0.2, 0.2, fill_mode='nearest'),
+            layers.RandomBrightness(0.2)
+        ], name='augmentation')
+        
+        # Datasets (unbatched, so the cache can be reshuffled per image)
+        train_ds, train_files = self._load_split('train', config.TRAIN_DIR,
+                                                 shuffle=True)
+        val_ds, self.val_files = self._load_split('validation', config.VAL_DIR,
+                                                  shuffle=False)
+        
+        logger.info(f"✓ Train samples: {len(train_files)}")
+        logger.info(f"✓ Validation samples: {len(self.val_files)}")
+        
+        config.TF_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        height, width = config.IMG_SIZE
+        
+        def to_uint8(x, y):
+            return tf.cast(tf.round(x), tf.uint8), y
+        
+        train_ds = train_ds.map(
+            to_uint8, num_parallel_calls=tf.data.AUTOTUNE
+        ).cache(
+            str(config.TF_CACHE_DIR / f"train_{height}x{width}")
+        ).shuffle(8192).batch(config.BATCH_SIZE).map(
+            lambda x, y: (augment(tf.cast(x, tf.float32), training=True), y),
+            num_parallel_calls=tf.data.AUTOTUNE
+        ).prefetch(tf.data.AUTOTUNE)
         
-        return train_gen, val_gen
+        # Validation (no augmentation)
+        val_ds = val_ds.map(
+            to_uint8, num_parallel_calls=tf.data.AUTOTUNE
+        ).cache(
+            str(config.TF_CACHE_DIR / f"validation_{height}x{width}")
+        ).batch(config.BATCH_SIZE).map(
+            lambda x, y: (tf.cast(x, tf.float32), y),
+            num_parallel_calls=tf.data.AUTOTUNE
+        ).prefetch(tf.data.AUTOTUNE)
+        
+        return train_ds, val_ds
+    
+    def _load_split(self, split: str, directory: Path, shuffle: bool) -> tuple:
+        """
+        Unbatched (image, one-hot label) dataset for one split
+        
+        Reads the split manifest written by prepare_data.py when present,
+        otherwise the split's class directories. Images are decoded and
+        resized to IMG_SIZE (bilinear, float32 0-255) either way.
+        
+        Returns:
+            tuple: (dataset, list of image file paths)
+        """
+        path = manifest_path(config.PROCESSED_DATA_DIR, split)
+        if not path.exists():
+            ds = tf.keras.utils.image_dataset_from_directory(
+                directory,
+                image_size=config.IMG_SIZE,
+                batch_size=None,
+                label_mode='categorical',
+                shuffle=shuffle
+            )
+            return ds, list(ds.file_paths)
+        
+        manifest = load_manifest(path)
+        num_classes = len(manifest.class_names)
+        
+        def load_image(image_path, label):
+            image = tf.io.decode_image(tf.io.read_file(image_path), channels=3,
+                                       expand_animations=False)
+            image = tf.image.resize(image, config.IMG_SIZE)
+            return image, tf.one_hot(label, num_classes)
+        
+        ds = tf.data.Dataset.from_tensor_slices((manifest.paths, manifest.labels))
+        if shuffle:
+            ds = ds.shuffle(len(manifest.paths))
+        ds = ds.map(load_image, num_parallel_calls=tf.data.AUTOTUNE)
+        return ds, manifest.paths
     
     def train(self, train_gen, val_gen, epochs: int):
         """Train model"""
@@ -155,7 +327,7 @@ class ModelTrainer:
                 mode='max',
                 verbose=1
             ),
-            keras.callbacks.CSVLogger(
+            AsyncCSVLogger(
                 str(config.LOG_DIR / 'training_history.csv')
             )
         ]
@@ -176,7 +348,7 @@ class ModelTrainer:
         logger.info(f"Starting fine-tuning for {epochs} epochs...")
         
         # Unfreeze base model
-        base_model = self.model.layers[0]
+        base_model = self._base_model()
         base_model.trainable = True
         
         # Freeze early layers
@@ -193,7 +365,8 @@ class ModelTrainer:
                     k=min(3, self.num_classes),
                     name='top_3_accuracy'
                 )
-            ]
+            ],
+            jit_compile=config.XLA_JIT
         )
         
         callbacks = [
@@ -227,24 +400,33 @@ class ModelTrainer:
         """Save final model"""
         logger.info("Saving models...")
         
+        model = self.model
+        if self.mixed_precision:
+            # Serve a float32 copy: float16 compute is slow on CPU. Mixed
+            # precision keeps float32 weights, so they transfer directly.
+            keras.mixed_precision.set_global_policy('float32')
+            model = self._build_network()
+            model.set_weights(self.model.get_weights())
+        
         # Save Keras model
         model_path = config.MODEL_PATH
-        self.model.save(str(model_path))
+        model.save(str(model_path))
         logger.info(f"✓ Keras model saved: {model_path}")
         
-        # Convert to TFLite
-        converter = tf.lite.TFLiteConverter.from_keras_model(self.model)
-        converter.optimizations = [tf.lite.Optimize.DEFAULT]
-        converter.target_spec.supported_types = [tf.float16]
-        
-        tflite_model = converter.convert()
-        
-        tflite_path = config.TFLITE_MODEL_PATH
-        with open(tflite_path, 'wb') as f:
-            f.write(tflite_model)
-        
-        size_kb = len(tflite_model) / 1024
-        logger.info(f"✓ TFLite model saved: {tflite_path} ({size_kb:.2f} KB)")
+        # The network rescales raw 0-255 pixels itself; serving and export
+        # read this instead of NORMALIZE_INPUT
+        save_model_metadata(config.MODEL_METADATA_PATH, normalize_input=False)
+        logger.info(f"✓ Model metadata saved: {config.MODEL_METADATA_PATH}")
+        
+        # Convert to a full-integer (INT8) TFLite model, calibrated on
+        # validation images; same conversion as scripts/export_model.py
+        exporter = ModelExporter(
+            model_path=model_path,
+            sample_dir=config.VAL_DIR,
+            sample_files=self.val_files,
+            normalize=False
+        )
+        exporter.export(config.TFLITE_MODEL_PATH)
 
 
 def main():
@@ -254,14 +436,23 @@ def main():
     print("MODEL TRAINING")
     print("="*70 + "\n")
     
-    # Check data directories
-    if not config.TRAIN_DIR.exists():
+    # XLA: fuse MobileNetV2's depthwise/pointwise/BN/activation chains into
+    # a few kernels; the global flag covers tf.functions outside Keras.
+    # Set here rather than at import so importing this module changes nothing
+    if config.XLA_JIT:
+        tf.config.optimizer.set_jit(True)
+    
+    # Check data (split manifests, or materialized split directories)
+    train_manifest = manifest_path(config.PROCESSED_DATA_DIR, 'train')
+    val_manifest = manifest_path(config.PROCESSED_DATA_DIR, 'validation')
+    
+    if not train_manifest.exists() and not config.TRAIN_DIR.exists():
         logger.error(f"Training directory not found: {config.TRAIN_DIR}")
         print("\n❌ Training data not found!")
         print("Please run 'python scripts/prepare_data.py' first!")
         return
     
-    if not config.VAL_DIR.exists():
+    if not val_manifest.exists() and not config.VAL_DIR.exists():
         logger.error(f"Validation directory not found: {config.VAL_DIR}")
         print("\n❌ Validation data not found!")
         print("Please run 'python scripts/prepare_data.py' first!")
@@ -269,22 +460,23 @@ def main():
     
     try:
         # Get number of classes
-        class_folders = [
-            d for d in config.TRAIN_DIR.iterdir()
-            if d.is_dir() and not d.name.startswith('.')
-        ]
-        num_classes = len(class_folders)
+        if train_manifest.exists():
+            class_names = load_manifest(train_manifest).class_names
+        else:
+            class_names = sorted(
+                d.name for d in config.TRAIN_DIR.iterdir()
+                if d.is_dir() and not d.name.startswith('.')
+            )
+        num_classes = len(class_names)
         
         if num_classes == 0:
-            raise ValueError("No classes found in training directory")
+            raise ValueError("No classes found in training data")
         
         logger.info(f"Detected {num_classes} classes")
-        class_names = sorted([d.name for d in class_folders])
         
         # Save class labels
         labels_path = config.CLASS_LABELS_PATH
-        with open(labels_path, 'w') as f:
-            json.dump(class_names, f, indent=2)
+        labels_path.write_bytes(orjson.dumps(class_names, option=orjson.OPT_INDENT_2))
         logger.info(f"✓ Class labels saved: {labels_path}")
         
         # Initialize trainer
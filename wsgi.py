@@ -4,6 +4,12 @@ Used by production WSGI servers like Gunicorn
 """
 
 import os
+
+# Patch the stdlib for gevent before TensorFlow and Flask are imported
+if os.getenv("GEVENT_MONKEY_PATCH", "False").lower() == "true":
+    from gevent import monkey
+    monkey.patch_all()
+
 from app import create_app
 
 # Set environment